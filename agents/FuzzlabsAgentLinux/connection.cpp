@@ -2,6 +2,7 @@
 
 Connection::Connection(int c_fd, struct sockaddr_in *c_sin) {
     sock = c_fd;
+    framed = 0;
     sin = c_sin;
     client_addr = (char *)inet_ntoa(sin->sin_addr);
 }
@@ -14,8 +15,81 @@ char *Connection::address() {
     return client_addr;
 }
 
+void Connection::setFramed(int value) {
+    framed = value;
+}
+
+int Connection::isFramed() {
+    return framed;
+}
+
+int Connection::sendAll(const char *data, size_t len) {
+    size_t total = 0;
+    ssize_t length = 0;
+
+    while (total < len) {
+        length = send(sock, data + total, len - total, MSG_NOSIGNAL);
+        if (length == -1 && errno == EINTR) continue;
+        if (length < 1) return(-1);
+        total += length;
+    }
+    return(0);
+}
+
 int Connection::transmit(const char *data, unsigned int len) {
-    return send(sock, data, len, 0);
+    if (!framed) return send(sock, data, len, 0);
+
+    // Framed messages are prefixed with their length as a 32 bit big endian
+    // integer. The prefix and the message are sent in a single buffer so
+    // they leave in the same segment.
+    uint32_t header = htonl(len);
+    char *message = (char *)malloc(len + sizeof(header));
+    if (message == NULL) return(-1);
+    memcpy(message, &header, sizeof(header));
+    memcpy(message + sizeof(header), data, len);
+    int rc = sendAll(message, len + sizeof(header));
+    free(message);
+    if (rc != 0) return(-1);
+    return(len);
+}
+
+int Connection::readAll(char *data, size_t len) {
+    size_t total = 0;
+    ssize_t length = 0;
+
+    while (total < len) {
+        length = recv(sock, data + total, len - total, 0);
+        if (length == -1 && errno == EINTR) continue;
+        if (length < 1) return(-1);
+        total += length;
+    }
+    return(0);
+}
+
+// Read one length prefixed message, blocking until it is complete. Returns
+// NULL if the connection was closed or the message is too large.
+
+char *Connection::receiveMessage() {
+    uint32_t header = 0;
+    char *data = NULL;
+
+    if (readAll((char *)&header, sizeof(header)) != 0) return(NULL);
+    header = ntohl(header);
+    if (header > RECV_MAX_MSG_SIZE * 1048576) {
+        syslog(LOG_ERR, "Connection::receiveMessage(): invalid message size");
+        return(NULL);
+    }
+
+    data = (char *)malloc(header + 1);
+    if (data == NULL) {
+        throw "Connection::receiveMessage(): failed to malloc() data buffer";
+    }
+    if (readAll(data, header) != 0) {
+        free(data);
+        return(NULL);
+    }
+    data[header] = 0x00;
+    return(data);
 }
 
 char *Connection::receive(char *data) {
@@ -11,6 +11,7 @@
 #include <sys/types.h>
 #include <sys/socket.h>
 #include <arpa/inet.h>
+#include <stdint.h>
 #include <errno.h>
 
 #include <syslog.h>
@@ -24,15 +25,21 @@
 class Connection {
 private:
     int sock;
+    int framed;
     struct sockaddr_in *sin;
     char *client_addr;
+    int readAll(char *data, size_t len);
+    int sendAll(const char *data, size_t len);
 public:
     Connection(int c_fd, struct sockaddr_in *c_sin);
     int socket();
     void terminate();
     char *address();
+    void setFramed(int value);
+    int isFramed();
     int transmit(const char *data, unsigned int len);
     char *receive(char *data);
+    char *receiveMessage();
 };
 
 #endif	/* CONNECTION_H */
@@ -53,6 +53,22 @@ int handle_command_ping(Connection *conn) {
     return(0);
 }
 
+// ----------------------------------------------------------------------------
+// Switch the connection to length prefixed messages if requested. The
+// response is still sent unframed, everything after it is framed.
+// ----------------------------------------------------------------------------
+
+int handle_command_protocol(Connection *conn, cJSON *data) {
+    if (data == NULL || data->valuestring == NULL ||
+        strcmp(data->valuestring, "length")) {
+        conn->transmit("{\"command\": \"protocol\", \"data\": \"failed\"}", 41);
+        return(0);
+    }
+    conn->transmit("{\"command\": \"protocol\", \"data\": \"length\"}", 41);
+    conn->setFramed(1);
+    return(1);
+}
+
 // ----------------------------------------------------------------------------
 //
 // ----------------------------------------------------------------------------
@@ -147,6 +163,8 @@ void process_command(Connection *conn, Monitor *monitor, char *data) {
                 cJSON_GetObjectItem(json, "data")->valuestring);
     } else if (!strcmp(cmd, "status")) {
         handle_command_status(conn, monitor);
+    } else if (!strcmp(cmd, "protocol")) {
+        handle_command_protocol(conn, cJSON_GetObjectItem(json, "data"));
     }
     
     if (json != NULL) cJSON_Delete(json);
@@ -166,8 +184,13 @@ static void *handle_connection(void *c) {
 
     while(r_len != 0) {
         try {
-            data = conn->receive(data);
-            if (r_len < 1 || data == NULL) continue;
+            if (conn->isFramed()) {
+                data = conn->receiveMessage();
+                if (data == NULL) break;
+            } else {
+                data = conn->receive(data);
+                if (r_len < 1 || data == NULL) continue;
+            }
             process_command(conn, monitor, data);
             free(data);
             data = NULL;
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+from struct import pack, unpack
 from anyjson import loads, dumps
 from socket import socket, timeout, AF_INET, SOCK_STREAM
 from thread import start_new_thread
@@ -31,22 +32,56 @@ class Listener:
                 continue
             start_new_thread(self.process_connection, (conn, addr))
 
+    def receive_all(self, conn, length):
+        data = ""
+        while len(data) < length:
+            tmp = conn.recv(length - len(data))
+            if not tmp: return None
+            data += tmp
+        return data
+
+    def receive_message(self, conn):
+        # Framed messages are prefixed with their length as a 32 bit big
+        # endian integer.
+        header = self.receive_all(conn, 4)
+        if not header: return None
+        length = unpack(">I", header)[0]
+        if length >= (self.RECV_MAX_MSG_SIZE * 1048576):
+            raise Exception("Connection::receive(): invalid message size")
+        return self.receive_all(conn, length)
+
+    def transmit(self, conn, response, framed):
+        if framed: response = pack(">I", len(response)) + response
+        conn.sendall(response)
+
     def process_connection(self, conn, addr):
         print "accepted connection from engine: %s" % addr[0]
+        framed = False
         try:
             while True:
-                data = ""
-                while True:
-                    tmp = conn.recv(
-                            RECV_BUFFER_SIZE, flags=socket.MSG_DONTWAIT)
-                    if not tmp: break
-                    data += tmp
-                    if len(data) >= (self.RECV_MAX_MSG_SIZE * 1048576):
-                        raise Exception(
-                                "Connection::receive(): invalid message size")
+                if framed:
+                    data = self.receive_message(conn)
+                else:
+                    data = ""
+                    while True:
+                        tmp = conn.recv(
+                                RECV_BUFFER_SIZE, flags=socket.MSG_DONTWAIT)
+                        if not tmp: break
+                        data += tmp
+                        if len(data) >= (self.RECV_MAX_MSG_SIZE * 1048576):
+                            raise Exception(
+                                    "Connection::receive(): invalid message size")
                 if not data:
                     break
                 data = loads(data)
+                if data["command"] == "protocol":
+                    # The response is sent unframed, everything after it is
+                    # framed.
+                    response = self.handle_command_protocol(data)
+                    self.transmit(conn, dumps({"command": "protocol",
+                                               "data": response}), False)
+                    framed = response == "length"
+                    continue
                 command = getattr(self, "handle_command_" + data["command"])
                 try:
                     response = command(data)
@@ -58,12 +93,16 @@ class Listener:
                     response = "failed"
                 response = {"command": data["command"], "data": response}
                 response = dumps(response)
-                conn.sendall(response)
+                self.transmit(conn, response, framed)
         except Exception:
             print "error processing command from engine: %s" % addr[0]
             print_exc()
         print "disconnected from engine: %s" % addr[0]
 
+    def handle_command_protocol(self, data):
+        if data.get("data") == "length": return "length"
+        return "failed"
+
     def handle_command_ping(self, data):
         return "pong"
 
@@ -0,0 +1,58 @@
+/* 
+ * File:   forkserver.c
+ *
+ * Fork server for the "process" transport media of the engine. The library
+ * is preloaded into the target using LD_PRELOAD. Its constructor runs before
+ * main(), after the target was loaded and linked, and turns the process into
+ * a fork server: for every test case the engine writes a command to the
+ * control descriptor, the server forks and the child returns from the
+ * constructor to run main() on the test case. The parent reports the process
+ * ID of the child and, once it exited, its wait status back to the engine on
+ * the status descriptor.
+ *
+ * If the status descriptor is not open, the library was loaded outside of the
+ * engine (for example by a process the target started) and does nothing.
+ */
+
+#include <stdint.h>
+#include <unistd.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+#define FORKSRV_CTL_FD      198
+#define FORKSRV_ST_FD       199
+
+// ----------------------------------------------------------------------------
+//
+// ----------------------------------------------------------------------------
+
+static void __attribute__((constructor)) forkserver(void) {
+    static const char hello[4] = {'F', 'L', 'F', 'S'};
+    uint32_t command = 0;
+    int32_t status = 0;
+    int32_t child = 0;
+    pid_t pid;
+
+    if (write(FORKSRV_ST_FD, hello, 4) != 4) return;
+
+    while (1) {
+        if (read(FORKSRV_CTL_FD, &command, 4) != 4) _exit(1);
+
+        pid = fork();
+        if (pid < 0) _exit(1);
+
+        if (pid == 0) {
+            close(FORKSRV_CTL_FD);
+            close(FORKSRV_ST_FD);
+            // The test case is rewritten for each run, so start reading
+            // it from the beginning. Fails harmlessly if stdin is not a file.
+            lseek(0, 0, SEEK_SET);
+            return;
+        }
+
+        child = pid;
+        if (write(FORKSRV_ST_FD, &child, 4) != 4) _exit(1);
+        if (waitpid(pid, &status, 0) < 0) _exit(1);
+        if (write(FORKSRV_ST_FD, &status, 4) != 4) _exit(1);
+    }
+}
@@ -1,10 +1,193 @@
+import os
+import sys
 import json
 import time
+import Queue
+import atexit
 import hashlib
-import inspect
 import syslog
+import threading
 from pymongo import MongoClient
 
+# -----------------------------------------------------------------------------
+# The log writer of each process, keyed by process ID. Forked processes do not
+# inherit the thread of the parent's writer, so they start their own.
+# -----------------------------------------------------------------------------
+
+LOG_WRITERS      = {}
+LOG_WRITERS_LOCK = threading.Lock()
+
+# -----------------------------------------------------------------------------
+# The MongoDB clients of each process, keyed by process ID and database URI.
+# The connections of a client must not be shared with forked processes, so
+# these get their own clients.
+# -----------------------------------------------------------------------------
+
+CLIENTS          = {}
+CLIENTS_LOCK     = threading.Lock()
+
+def getClient(config):
+    """
+    Return the MongoDB client of the current process for the configured
+    database, create it if there is none yet. The client options, such as the
+    connection pool size and timeouts, are taken from the "database_options"
+    of the "general" section of the configuration:
+
+    "database_options": {
+        "maxPoolSize": 10,
+        "connectTimeoutMS": 5000,
+        "socketTimeoutMS": 30000
+    }
+
+    @type  config:   Dictionary
+    @param config:   A dictionary containing the FuzzLabs configuration
+
+    @rtype:          MongoClient
+    @return:         The shared client
+    """
+
+    pid = os.getpid()
+    uri = config['general']['database']
+    client = CLIENTS.get((pid, uri))
+    if client != None: return client
+
+    with CLIENTS_LOCK:
+        client = CLIENTS.get((pid, uri))
+        if client == None:
+            options = config['general'].get('database_options', {})
+            options = dict((str(k), v) for (k, v) in options.items())
+            client = MongoClient(uri, **options)
+            # clients inherited from the parent process are not to be used
+            for key in CLIENTS.keys():
+                if key[0] != pid: del CLIENTS[key]
+            CLIENTS[(pid, uri)] = client
+    return client
+
+class LogWriter(threading.Thread):
+    """
+    Background thread inserting log records into the database in batches. The
+    records are buffered in a bounded queue; if the buffer is full, records are
+    dropped and the number of dropped records is logged once there is room
+    again. The buffer and batch sizes are configured in the "logging" section
+    of the configuration:
+
+    "logging": {
+        "buffer_size": 10000,
+        "batch_size": 100
+    }
+    """
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, collection, config):
+        """
+        Initialize the log writer.
+
+        @type  collection: pymongo.collection.Collection
+        @param collection: The collection to insert the log records into
+        @type  config:     Dictionary
+        @param config:     A dictionary containing the FuzzLabs configuration
+        """
+
+        threading.Thread.__init__(self)
+        self.daemon     = True
+
+        settings        = config.get('logging', {})
+        self.collection = collection
+        self.batch_size = int(settings.get('batch_size', 100))
+        self.queue      = Queue.Queue(int(settings.get('buffer_size', 10000)))
+        self.dropped    = 0
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def put(self, record):
+        """
+        Buffer a log record to be inserted.
+
+        @type  record:   Dictionary
+        @param record:   The log record
+
+        @rtype:          Boolean
+        @return:         True if the record was buffered, False if dropped
+        """
+
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def flush(self):
+        """
+        Wait until all the buffered records are inserted.
+        """
+
+        self.queue.join()
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except Queue.Empty:
+                pass
+
+            taken = len(batch)
+
+            if self.dropped:
+                dropped = self.dropped
+                self.dropped -= dropped
+                batch.append({
+                    "time":     time.time(),
+                    "severity": "warning",
+                    "message":  "%d log messages dropped, buffer full" % dropped
+                })
+
+            try:
+                self.collection.insert(batch)
+            except Exception, ex:
+                syslog.syslog(syslog.LOG_ERR,
+                              "CRITICAL: database log() failed (%s)" %\
+                              str(ex))
+
+            for index in xrange(taken):
+                self.queue.task_done()
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def flushLogWriter():
+    """
+    Wait until the log writer of the current process inserted all the buffered
+    records. Also called on exit, worker processes exiting without running the
+    exit handlers have to call it themselves.
+    """
+
+    writer = LOG_WRITERS.get(os.getpid())
+    if writer != None and writer.is_alive():
+        writer.flush()
+
+atexit.register(flushLogWriter)
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
 class DatabaseHandler:
 
     # -------------------------------------------------------------------------
@@ -18,7 +201,7 @@ class DatabaseHandler:
 
         self.config   = config
         self.root     = root
-        self.dbclient = MongoClient(self.config['general']['database'])
+        self.dbclient = getClient(self.config)
         self.database = self.dbclient.engine
         syslog.openlog(logoption=syslog.LOG_PID, facility=syslog.LOG_DAEMON)
 
@@ -41,10 +224,11 @@ class DatabaseHandler:
     #
     # -------------------------------------------------------------------------
 
-    def loadSession(self, job_id = None):
+    def loadSession(self, job_id = None, shard = None):
         if not job_id: return False
         try:
-            r = self.database.sessions.find(spec={"job_id": job_id}, fields={'_id': False})
+            r = self.database.sessions.find(spec={"job_id": job_id, "shard": shard},
+                                            fields={'_id': False})
             for session in r:
                 return session
             return None
@@ -58,10 +242,10 @@ class DatabaseHandler:
     #
     # -------------------------------------------------------------------------
 
-    def updateSession(self, job_id, data = None):
+    def updateSession(self, job_id, data = None, shard = None):
         if not data: return False
         try:
-            self.database.sessions.update({"job_id": job_id}, data)
+            self.database.sessions.update({"job_id": job_id, "shard": shard}, data)
         except Exception, ex:
             self.log("critical",
                      "database updateSession() failed",
@@ -88,6 +272,55 @@ class DatabaseHandler:
     #
     # -------------------------------------------------------------------------
 
+    def mergeShards(self, job):
+        """
+        Jobs executed by multiple workers have the status of each worker
+        stored separately under the "shards" key. Merge these into the
+        job level status fields so the job looks like any other job.
+        """
+
+        shards = job.get("shards")
+        if not shards: return job
+
+        workers = 1
+        try:
+            workers = int(job.get("session", {}).get("workers", 1))
+        except Exception, ex:
+            pass
+
+        statuses = []
+        job["node"]      = ""
+        job["crashes"]   = 0
+        job["warnings"]  = 0
+        job["c_m_index"] = 0
+        job["t_m_index"] = 0
+
+        for shard in shards.values():
+            statuses.append(shard.get("status"))
+            job["crashes"]   += shard.get("crashes") or 0
+            job["warnings"]  += shard.get("warnings") or 0
+            job["c_m_index"] += shard.get("c_m_index") or 0
+            job["t_m_index"]  = max(job["t_m_index"], shard.get("t_m_index"))
+            if shard.get("status") == 1 and shard.get("node"):
+                job["node"] = shard.get("node")
+
+        # the job is running as long as any of the workers is running,
+        # finished only if all of them have finished.
+        if 1 in statuses or len(shards) < workers:
+            job["status"] = 1
+        elif 2 in statuses:
+            job["status"] = 2
+        elif statuses.count(3) == len(statuses):
+            job["status"] = 3
+        else:
+            job["status"] = 0
+
+        return job
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
     def loadJobs(self):
         """
         Returns a simple list of all jobs in the database.
@@ -97,7 +330,7 @@ class DatabaseHandler:
         try:
             r = self.database.jobs.find(fields={'_id': False})
             for job in r:
-                jobs_list.append(job)
+                jobs_list.append(self.mergeShards(job))
             return jobs_list
         except Exception, ex:
             self.log("critical",
@@ -117,7 +350,7 @@ class DatabaseHandler:
         try:
             r = self.database.jobs.find({"job_id": job_id}, fields={'_id': False})
             for job in r:
-                return job
+                return self.mergeShards(job)
             return None
         except Exception, ex:
             self.log("critical",
@@ -129,6 +362,69 @@ class DatabaseHandler:
     #
     # -------------------------------------------------------------------------
 
+    def mergeTiming(self, timings):
+        """
+        Add up the phase timings reported by the workers of a sharded job,
+        see the timing module of sulley for the format.
+        """
+
+        merged = {"clock": None, "elapsed": 0, "phases": {}}
+        for timing in timings:
+            merged["clock"] = timing.get("clock")
+            merged["elapsed"] = max(merged["elapsed"], timing.get("elapsed", 0))
+            for (name, phase) in timing.get("phases", {}).items():
+                total = merged["phases"].get(name)
+                if total == None:
+                    merged["phases"][name] = dict(phase)
+                    merged["phases"][name]["histogram"] = \
+                        list(phase.get("histogram", []))
+                    continue
+                total["count"] += phase["count"]
+                total["total"] += phase["total"]
+                total["min"]    = min(total["min"], phase["min"])
+                total["max"]    = max(total["max"], phase["max"])
+                histogram = phase.get("histogram", [])
+                if len(histogram) > len(total["histogram"]):
+                    total["histogram"] += [0] * (len(histogram) -
+                                                 len(total["histogram"]))
+                for i in range(len(histogram)):
+                    total["histogram"][i] += histogram[i]
+        return merged
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def loadJobTiming(self, job_id):
+        """
+        Returns the time spent in each phase of the fuzzing session of a job,
+        or None if the job has not reported any yet.
+        """
+
+        try:
+            job = self.database.jobs.find_one({"job_id": job_id},
+                                              fields={'_id': False,
+                                                      'stats': True,
+                                                      'shards': True})
+        except Exception, ex:
+            self.log("critical",
+                     "database loadJobTiming() failed",
+                     str(ex))
+            return None
+
+        if not job: return None
+        if not job.get("shards"):
+            return job.get("stats", {}).get("timing")
+
+        timings = [shard["stats"]["timing"] for shard in job["shards"].values()
+                   if shard.get("stats", {}).get("timing")]
+        if not timings: return None
+        return self.mergeTiming(timings)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
     def insertJob(self, data = None):
         """
         Insert a new job.
@@ -150,19 +446,29 @@ class DatabaseHandler:
     # -------------------------------------------------------------------------
 
     def updateJob(self, job_id, status = None, node = None, crashes = None,
-                  warnings = None, c_m_index = None, t_m_index = None):
-
+                  warnings = None, c_m_index = None, t_m_index = None,
+                  shard = None, stats = None):
+
+        # the status of the workers of a sharded job is stored per worker,
+        # see mergeShards().
+        prefix = ""
+        if shard != None:
+            prefix = "shards.%d." % shard
+
+        fields = {
+            prefix + "status":    status,
+            prefix + "node":      node,
+            prefix + "crashes":   crashes,
+            prefix + "warnings":  warnings,
+            prefix + "c_m_index": c_m_index,
+            prefix + "t_m_index": t_m_index
+        }
+        if stats != None:
+            fields[prefix + "stats"] = stats
 
         try:
             r = self.database.jobs.update({"job_id": job_id}, {
-                "$set": {
-                    "status":    status,
-                    "node":      node,
-                    "crashes":   crashes,
-                    "warnings":  warnings,
-                    "c_m_index": c_m_index,
-                    "t_m_index": t_m_index
-                }
+                "$set": fields
             })
         except Exception, ex:
             self.log("critical",
@@ -211,6 +517,12 @@ class DatabaseHandler:
                 "mutant_index": data.get("mutant_index"),
                 "node":         data.get("name"),
                 "severity":     severity,
+                "seed":         data.get("seed"),
+                "storage":      data.get("storage", "copy"),
+                "descriptor":   data.get("descriptor"),
+                "path":         data.get("path"),
+                "sent":         data.get("sent"),
+                "sha1":         data.get("sha1"),
                 "info":    {
                     "mutant_index": data.get("mutant_index"),
                     "node":         data.get("name"),
@@ -305,8 +617,6 @@ class DatabaseHandler:
            severity != "critical":
             return False
 
-        caller = inspect.stack()[:2][1]
-
         try:
             logmsg = {
                 "time":      time.time(),
@@ -316,21 +626,61 @@ class DatabaseHandler:
 
             if severity == "debug" or severity == "error" or\
                severity == "critical":
+                caller = sys._getframe(1)
                 logmsg["source"] = {
-                    "method": str(caller[3]),
-                    "line":   str(caller[2]),
-                    "file":   str(caller[1])
+                    "method": str(caller.f_code.co_name),
+                    "line":   str(caller.f_lineno),
+                    "file":   str(caller.f_code.co_filename)
                 }
                 logmsg["exception"] = str(errdetail)
 
-            r = self.database.logs.insert(logmsg)
+            # the record is inserted by the log writer of the process in the
+            # background, see LogWriter.
+            return self.logWriter().put(logmsg)
 
         except Exception, ex:
             syslog.syslog(syslog.LOG_ERR,
                           "CRITICAL: database log() failed (%s)" %\
                           str(ex))
             return False
-        return True
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def logWriter(self):
+        """
+        Return the log writer of the current process, start it if not running
+        yet.
+
+        @rtype:          LogWriter
+        @return:         The log writer
+        """
+
+        pid = os.getpid()
+        writer = LOG_WRITERS.get(pid)
+        if writer != None: return writer
+
+        with LOG_WRITERS_LOCK:
+            writer = LOG_WRITERS.get(pid)
+            if writer == None:
+                writer = LogWriter(self.database.logs, self.config)
+                writer.start()
+                # writers inherited from the parent process are not running
+                LOG_WRITERS.clear()
+                LOG_WRITERS[pid] = writer
+        return writer
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def flushLogs(self):
+        """
+        Wait until the log records buffered by this process are inserted.
+        """
+
+        flushLogWriter()
 
     # -------------------------------------------------------------------------
     #
@@ -340,6 +690,9 @@ class DatabaseHandler:
         if not timestamp:
             timestamp = 0
 
+        # make sure the records logged by this process are included.
+        self.flushLogs()
+
         logs = []
 
         if type(timestamp) == str:
@@ -0,0 +1,163 @@
+"""
+Render the test cases of the issues stored by reference again.
+"""
+
+import sys
+import md5
+import time
+import Queue
+import base64
+import hashlib
+import multiprocessing
+
+# -----------------------------------------------------------------------------
+# The descriptor registers its requests with sulley when imported, which can
+# be done only once per process. Each test case is rendered in a process of
+# its own, so is the job the issue was found by.
+# -----------------------------------------------------------------------------
+
+def render_case(root, config, issue, job, queue):
+    try:
+        sys.path.insert(0, root + "/modules/jobshandler")
+        sys.path.insert(0, root + "/requests")
+        from sulley import sessions, blocks
+
+        request_file = job['request']['request_file']
+        descriptor = md5.new(open(root + "/requests/" + request_file +
+                                  ".py").read()).hexdigest()
+        if descriptor != issue.get('descriptor'):
+            raise Exception("descriptor changed since the issue was found")
+
+        __import__(request_file)
+
+        # the test case is rendered without being sent, the loopback media
+        # stands in for the one of the job.
+        session = sessions.session(config, root, job['job_id'], {},
+                                   {"media": "loopback",
+                                    "protocol": "loopback"},
+                                   job['conditions'], job)
+
+        for path in job['request']['graph']:
+            n_c = path.get('current')
+            if n_c != None: n_c = blocks.REQUESTS[n_c]
+            n_n = path.get('next')
+            if n_n != None: n_n = blocks.REQUESTS[n_n]
+            session.connect(n_c, n_n)
+
+        (path, node_index) = session.locate(issue['mutant_index'])
+        if path == None:
+            raise Exception("test case not found in the job")
+
+        # the node sent when the issue was found may be one of the nodes leading
+        # to the node fuzzed, these are sent unmutated.
+        sent = issue.get('sent')
+        if sent == None: sent = len(path) - 1
+        if sent < 0 or sent >= len(path):
+            raise Exception("node sent not found on the path of the test case")
+
+        node = session.nodes[path[sent].dst]
+        if sent == len(path) - 1:
+            node.seek(node_index)
+        data = node.render()
+
+        if hashlib.sha1(data).hexdigest() != issue.get('sha1'):
+            raise Exception("test case rendered does not match the issue")
+
+        queue.put({"payload": base64.b64encode(data)})
+    except Exception, ex:
+        queue.put({"error": str(ex)})
+
+class IssueReplay:
+    """
+    Issues saved with the "reference" issue storage of a job only record the
+    hash of the descriptor, the path to the node fuzzed, the position of the
+    node sent on that path, the mutant index and the seed of the job along
+    with the hash of the test case. The test case is rendered again from
+    these on request.
+
+    The test cases passed to an edge callback before being sent may differ
+    from the ones rendered here, these are reported as not matching.
+    """
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, root, config, database, timeout = 60):
+        """
+        Initialize the issue replay.
+
+        @type  root:     String
+        @param root:     The root directory of the engine
+        @type  config:   Dictionary
+        @param config:   A dictionary containing the FuzzLabs configuration
+        @type  database: DatabaseHandler
+        @param database: The database handler to load the issues and jobs with
+        @type  timeout:  Integer
+        @param timeout:  The maximum number of seconds to wait for a test case
+                         to be rendered
+        """
+
+        self.root     = root
+        self.config   = config
+        self.database = database
+        self.timeout  = timeout
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def payload(self, issue_id):
+        """
+        Return the test case of an issue, base64 encoded. Issues saved with a
+        copy of the test case return the copy.
+
+        @type  issue_id: String
+        @param issue_id: The ID of the issue
+
+        @rtype:          String
+        @return:         The base64 encoded test case, raises an exception
+                         with the reason if it cannot be rendered
+        """
+
+        issue = self.database.loadIssue(issue_id)
+        if not issue:
+            raise Exception("issue not found")
+
+        if issue.get('storage', "copy") != "reference":
+            return issue.get('payload')
+
+        job = self.database.loadJob(issue['job_id'])
+        if not job:
+            raise Exception("job of the issue not found")
+
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=render_case,
+                                    args=(self.root, self.config, issue,
+                                          job, queue))
+        p.start()
+
+        # the process may exit without a result, ie: if the session fails to
+        # initialize or the descriptor fails to import.
+        result   = None
+        deadline = time.time() + self.timeout
+        while result == None:
+            try:
+                result = queue.get(True, 0.5)
+            except Queue.Empty:
+                if not p.is_alive():
+                    try:
+                        result = queue.get_nowait()
+                    except Queue.Empty:
+                        p.join()
+                        raise Exception("replay process exited with code %s" %
+                                        str(p.exitcode))
+                elif time.time() > deadline:
+                    p.terminate()
+                    p.join()
+                    raise Exception("replay timed out")
+        p.join()
+
+        if result.get('error'):
+            raise Exception(result['error'])
+        return result['payload']
@@ -0,0 +1,161 @@
+"""
+Write-behind persistence of the job status and session data.
+"""
+
+import time
+import threading
+
+class StatusWriter:
+    """
+    Keep the latest job status and session data of a fuzzing session in
+    memory and write them to the database on a time or count interval
+    instead of on every test case. The intervals are configured in the
+    "status" section of the configuration:
+
+    "status": {
+        "flush_interval": 1.0,
+        "flush_count": 100
+    }
+
+    The flush_interval is the maximum number of seconds and flush_count the
+    maximum number of updates to hold back. Updates passing force=True, such
+    as the ones reporting a pause, crash, termination or the end of the job,
+    are written immediately along with anything pending.
+    """
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, config, database, job_id, shard = None):
+        """
+        Initialize the status writer.
+
+        @type  config:   Dictionary
+        @param config:   A dictionary containing the FuzzLabs configuration
+        @type  database: DatabaseHandler
+        @param database: The database handler to write the status with
+        @type  job_id:   String
+        @param job_id:   The ID of the job
+        @type  shard:    Integer
+        @param shard:    The index of the worker if the job is split between
+                         multiple workers
+        """
+
+        settings = config.get('status', {})
+
+        self.database       = database
+        self.job_id         = job_id
+        self.shard          = shard
+        self.flush_interval = float(settings.get('flush_interval', 1.0))
+        self.flush_count    = int(settings.get('flush_count', 100))
+
+        self.lock           = threading.Lock()
+        self.job_status     = None
+        self.job_stats      = None
+        self.session_data   = None
+        self.session_exists = None
+        self.pending        = 0
+        self.last_flush     = time.time()
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def updateJob(self, status, node, crashes, warnings, c_m_index,
+                  t_m_index, force = False, stats = None):
+        """
+        Record the status of the job, see DatabaseHandler.updateJob().
+
+        @type  force:    Boolean
+        @param force:    Write the status to the database immediately
+        @type  stats:    Dictionary
+        @param stats:    Statistics of the session to store with the status,
+                         or a function returning them which is only called
+                         when the status is written
+        """
+
+        with self.lock:
+            self.job_status = (status, node, crashes, warnings, c_m_index,
+                               t_m_index)
+            self.job_stats  = stats
+            self.pending += 1
+
+        self.flush(force)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def updateSession(self, data, force = False):
+        """
+        Record the session data of the job. The session document is created
+        on the first write, later writes update it.
+
+        @type  data:     Dictionary
+        @param data:     The complete session document
+        @type  force:    Boolean
+        @param force:    Write the session data to the database immediately
+        """
+
+        with self.lock:
+            self.session_data = data
+            self.pending += 1
+
+        self.flush(force)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def flush(self, force = True):
+        """
+        Write the pending job status and session data to the database if
+        forced or if any of the flush intervals elapsed.
+
+        @type  force:    Boolean
+        @param force:    Write regardless of the flush intervals
+        """
+
+        with self.lock:
+            if not self.pending: return
+            if not force and self.pending < self.flush_count and \
+               time.time() - self.last_flush < self.flush_interval:
+                return
+
+            job_status        = self.job_status
+            session_data      = self.session_data
+            self.job_status   = None
+            self.session_data = None
+            self.pending      = 0
+            self.last_flush   = time.time()
+
+            if job_status:
+                stats = self.job_stats
+                if callable(stats): stats = stats()
+                self.database.updateJob(self.job_id, *job_status,
+                                        shard = self.shard,
+                                        stats = stats)
+
+            if session_data:
+                self.__writeSession(session_data)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __writeSession(self, data):
+        """
+        Insert or update the session document. Whether the document exists is
+        only looked up on the first write.
+        """
+
+        if self.session_exists == None:
+            self.session_exists = bool(self.database.loadSession(self.job_id,
+                                                                 self.shard))
+
+        if self.session_exists:
+            self.database.updateSession(self.job_id, {"$set": data},
+                                        self.shard)
+        else:
+            self.session_exists = self.database.saveSession(data)
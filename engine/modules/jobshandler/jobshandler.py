@@ -21,6 +21,7 @@ from pydispatch import dispatcher
 from multiprocessing import Process
 
 from jobworker import jobworker
+from jobswatcher import jobswatcher
 from classes import Event as ev
 from classes import DatabaseHandler as dh
 
@@ -61,6 +62,8 @@ class jobshandler(threading.Thread):
         self.id                = self.generate_id()
         self.database          = dh.DatabaseHandler(self.config, self.root)
         self.workers           = []
+        self.p_queue           = multiprocessing.Queue()
+        self.watcher           = None
 
     # -------------------------------------------------------------------------
     #
@@ -135,6 +138,11 @@ class jobshandler(threading.Thread):
         job_data["job_started"] = 0
         job_data["job_stopped"] = 0
 
+        # the random primitives derive their mutations from the seed of the
+        # job, so the issues found can be reproduced. a seed can be given in
+        # the job file to reproduce the mutations of an earlier job.
+        if job_data.get("seed") == None:
+            job_data["seed"] = "%016x" % random.getrandbits(64)
 
         job_lock = job_file.split(".")
         job_lock[len(job_lock) - 1] = "jlock"
@@ -226,28 +234,27 @@ class jobshandler(threading.Thread):
 
     def listener(self):
         """
-        Check every queue assigned to workers to see if there is a message
-        sent by a worker waiting to be processed.
+        Wait for messages sent by the workers. All workers send their messages
+        to the same queue, so the listener can block on it and handle the
+        messages as soon as they arrive. The timeout is only there to notice
+        when the job handler is stopped.
         """
 
         self.database.log("info", "queue listener started")
         while self.running:
-            for worker in self.workers:
-                cmd = None
-                try:
-                    cmd = worker["p_queue"].get_nowait()
-                except Queue.Empty:
-                    pass
-                if not cmd: continue
+            try:
+                cmd = self.p_queue.get(timeout=1)
+            except Queue.Empty:
+                continue
+            if not cmd or cmd.get("to") != self.id: continue
 
-                try:
-                    getattr(self, 'q_handle_' + cmd["command"], None)(cmd)
-                except Exception, ex:
-                    self.database.log("error",
-                                      "failed to execute queue handler '%s'" %\
-                                      cmd["command"],
-                                      str(ex))
-            time.sleep(1)
+            try:
+                getattr(self, 'q_handle_' + cmd["command"], None)(cmd)
+            except Exception, ex:
+                self.database.log("error",
+                                  "failed to execute queue handler '%s'" %\
+                                  cmd["command"],
+                                  str(ex))
 
     # -------------------------------------------------------------------------
     #
@@ -294,65 +301,127 @@ class jobshandler(threading.Thread):
 
     def start_worker(self, job_id):
         """
-        Spawn a worker process to executed the job identified by job_id.
+        Spawn the worker processes to execute the job identified by job_id.
+        By default a single worker is started. If the job sets the number of
+        workers in its session settings the test cases are split into
+        contiguous ranges and each range is executed by a separate worker.
 
         @type  job_id:   String
         @param job_id:   The ID of the job to be executed
 
-        @rtype:          Dictionary
-        @return:         Dictionary with details related to the worker
+        @rtype:          List
+        @return:         List of dictionaries with details related to the
+                         workers
         """
 
-        worker = {}
-        worker["id"]       = self.generate_id()
-
-        self.database.log("info", "initializing worker: %s" % worker["id"])
-
-        worker["job_id"]   = job_id
-        worker["c_queue"]  = multiprocessing.Queue()
-        worker["p_queue"]  = multiprocessing.Queue()
-
         job_data = None
 
         try:
             job_data = self.database.loadJob(job_id)
             if not job_data:
                 self.database.log("error",
-                                  "failed to load data for job %s" % job_id,
-                                  str(ex))
+                                  "failed to load data for job %s" % job_id)
+                return False
         except Exception, ex:
             self.database.log("error",
                               "error loading data for job %s" % job_id,
                               str(ex))
             return False
 
+        shards = [None]
         try:
-            worker["instance"] = jobworker(self.id,
-                                           worker["id"],
-                                           job_id,
-                                           worker["c_queue"],
-                                           worker["p_queue"],
-                                           self.root,
-                                           self.config,
-                                           job_data)
+            count = int(job_data.get('session', {}).get('workers', 1))
+            if count > 1: shards = range(0, count)
         except Exception, ex:
             self.database.log("error",
-                              "failed to initialize worker for job %s" %\
-                              job_id,
+                              "invalid number of workers for job %s" % job_id,
                               str(ex))
             return False
 
-        try:
-            worker["process"] = Process(target=worker["instance"].run)
-            worker["process"].start()
-        except Exception, ex:
-            self.database.log("error",
-                              "failed to start job %s" % job_id,
-                              str(ex))
-            return False
+        workers = []
+        for shard in shards:
+            worker = {}
+            worker["id"]       = self.generate_id()
+
+            self.database.log("info", "initializing worker: %s" % worker["id"])
+
+            worker["job_id"]   = job_id
+            worker["shard"]    = shard
+            worker["c_queue"]  = multiprocessing.Queue()
+            worker["p_queue"]  = self.p_queue
+
+            try:
+                worker["instance"] = jobworker(self.id,
+                                               worker["id"],
+                                               job_id,
+                                               worker["c_queue"],
+                                               worker["p_queue"],
+                                               self.root,
+                                               self.config,
+                                               job_data,
+                                               shard)
+            except Exception, ex:
+                self.database.log("error",
+                                  "failed to initialize worker for job %s" %\
+                                  job_id,
+                                  str(ex))
+                self.abort_workers(job_id, workers)
+                return False
+
+            try:
+                worker["process"] = Process(target=worker["instance"].run)
+                worker["process"].start()
+            except Exception, ex:
+                self.database.log("error",
+                                  "failed to start job %s" % job_id,
+                                  str(ex))
+                self.abort_workers(job_id, workers)
+                return False
+
+            self.workers.append(worker)
+            workers.append(worker)
+
+        return workers
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def abort_workers(self, job_id, workers):
+        """
+        Stop the workers already started for a job when the rest of its
+        workers could not be started. Otherwise the job would be considered
+        running and a new start request would only resume it, the test cases
+        of the missing workers would never be executed.
+
+        @type  job_id:   String
+        @param job_id:   The ID of the job
+        @type  workers:  List
+        @param workers:  The workers started for the job
+        """
+
+        for worker in workers:
+            self.send_to(worker["id"], "job_stop", job_id)
 
-        self.workers.append(worker)
-        return worker
+        # a worker still setting up the job ignores the stop request, it is
+        # terminated if it does not stop in time.
+        deadline = time.time() + 10
+
+        for worker in workers:
+            self.workers.remove(worker)
+
+            try:
+                worker["process"].join(max(0, deadline - time.time()))
+                if worker["process"].is_alive():
+                    worker["process"].terminate()
+                    worker["process"].join()
+            except Exception, ex:
+                self.database.log("error",
+                                  "failed to stop worker %s" % worker["id"],
+                                  str(ex))
+
+            worker["c_queue"].close()
+            worker["c_queue"].join_thread()
 
     # -------------------------------------------------------------------------
     #
@@ -505,15 +574,30 @@ class jobshandler(threading.Thread):
                            signal=ev.Event.EVENT__REQ_JOB_DELETE,
                            sender=dispatcher.Any)
 
+        self.watcher = jobswatcher(self.jobs_dir)
+        if self.watcher.is_polling():
+            self.database.log("warning",
+                              "inotify not available, polling jobs directory")
+
+        changed = True
         while self.running:
+            if changed:
+                try:
+                    self.check_jobs()
+                except Exception, ex:
+                    self.database.log("error", 
+                                      "failed to process jobs",
+                                      str(ex))
+
             try:
-                self.check_jobs()
+                changed = self.watcher.wait(2)
             except Exception, ex:
-                self.database.log("error", 
-                                  "failed to process jobs",
+                self.database.log("error",
+                                  "failed to watch jobs directory, polling",
                                   str(ex))
+                self.watcher.close()
+                changed = True
 
-            time.sleep(2)
-
+        self.watcher.close()
         self.database.log("info", "job handler stopped")
 
@@ -0,0 +1,177 @@
+"""
+Watch the jobs directory for new job files.
+"""
+
+import os
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+
+# -----------------------------------------------------------------------------
+# inotify constants, see inotify(7)
+# -----------------------------------------------------------------------------
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_Q_OVERFLOW  = 0x00004000
+IN_NONBLOCK    = 0x00000800
+IN_CLOEXEC     = 0x00080000
+
+EVENT_HEADER   = struct.Struct("iIII")
+
+# =============================================================================
+#
+# =============================================================================
+
+class jobswatcher:
+    """
+    Wait for job files to show up in the jobs directory. On Linux the
+    directory is watched using inotify, so new jobs are picked up as soon as
+    they were written or moved into the directory. Where inotify is not
+    available the directory is polled: wait() returns once the poll
+    interval elapsed.
+    """
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, path, extension = ".job"):
+        """
+        Initialize the watcher.
+
+        @type  path:      String
+        @param path:      The full path to the jobs directory
+        @type  extension: String
+        @param extension: The extension of the files to watch for
+        """
+
+        self.path      = path
+        self.extension = extension
+        self.fd        = None
+
+        try:
+            self.fd = self.__inotify_init()
+        except Exception, ex:
+            self.fd = None
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __inotify_init(self):
+        """
+        Set up an inotify instance watching the jobs directory.
+
+        @rtype:          Integer
+        @return:         The inotify file descriptor
+        """
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not supported")
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        wd = libc.inotify_add_watch(fd, self.path,
+                                    IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+        return fd
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def is_polling(self):
+        """
+        Return True if the directory is polled instead of being watched.
+        """
+
+        return self.fd == None
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def wait(self, timeout):
+        """
+        Wait for a job file to be written to or moved into the jobs
+        directory.
+
+        @type  timeout:  Float
+        @param timeout:  The maximum number of seconds to wait
+
+        @rtype:          Boolean
+        @return:         True if there may be new job files, otherwise False
+        """
+
+        if self.fd == None:
+            time.sleep(timeout)
+            return True
+
+        try:
+            ready = select.select([self.fd], [], [], timeout)[0]
+        except select.error, ex:
+            if ex.args[0] == errno.EINTR: return False
+            raise
+        if not ready: return False
+
+        return self.__read_events()
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __read_events(self):
+        """
+        Read the pending inotify events.
+
+        @rtype:          Boolean
+        @return:         True if any of the events relate to a job file
+        """
+
+        found = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except OSError, ex:
+                if ex.errno == errno.EAGAIN: break
+                raise
+            if not data: break
+
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data,
+                                                                    offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip("\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW or name.endswith(self.extension):
+                    found = True
+
+        return found
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def close(self):
+        """
+        Stop watching the jobs directory.
+        """
+
+        if self.fd == None: return
+        try:
+            os.close(self.fd)
+        except OSError, ex:
+            pass
+        self.fd = None
@@ -25,7 +25,8 @@ class jobworker():
     # 
     # -------------------------------------------------------------------------
 
-    def __init__(self, parent, id, job_id, c_queue, p_queue, root, config, job):
+    def __init__(self, parent, id, job_id, c_queue, p_queue, root, config, job,
+                 shard = None):
         """
         Initialize the worker
 
@@ -41,6 +42,11 @@ class jobworker():
         @param root:     The root directory of FuzzLabs
         @type  config:   Dictionary
         @param config:   A dictionary containing the FuzzLabs configuration
+        @type  job:      Dictionary
+        @param job:      The job to be executed
+        @type  shard:    Integer
+        @param shard:    The index of the range of test cases to be executed
+                         if the job is split between multiple workers
         """
 
         self.root              = root
@@ -52,6 +58,7 @@ class jobworker():
         self.running           = False
         self.core              = None
         self.job_data          = job
+        self.shard             = shard
 
         self.job_id            = job_id
         self.job_status        = {}
@@ -222,6 +229,10 @@ class jobworker():
 
         self.database.log("info", "w[%s] terminated" % self.id)
 
+        # the worker process exits without running the exit handlers, make
+        # sure the buffered log records make it to the database.
+        self.database.flushLogs()
+
     # -------------------------------------------------------------------------
     #
     # -------------------------------------------------------------------------
@@ -290,7 +301,8 @@ class jobworker():
                                  settings,
                                  transport,
                                  conditions,
-                                 self.job_data)
+                                 self.job_data,
+                                 self.shard)
             self.core.add_target(endpoint)
 
             if agent and agent != {}:
@@ -350,8 +362,11 @@ class jobworker():
                               (self.id, self.job_id), 
                               str(ex))
             self.running = False
+            self.core.media_cleanup()
             return
 
+        self.core.media_cleanup()
+
         try:
             self.job_status = self.core.get_status()
         except Exception, ex:
@@ -367,12 +382,21 @@ class jobworker():
 
     def listener(self):
         """
-        Listen for messages on the queue.
+        Listen for messages on the queue. The receive blocks until a message
+        arrives, the timeout is only there to notice when the worker is done.
         """
 
         while self.running:
-            try: self.handle(self.c_queue.get_nowait())
-            except Exception, ex: pass
+            try:
+                cmd = self.c_queue.get(timeout=1)
+            except Queue.Empty:
+                continue
+            except EOFError:
+                # the parent closed the queue
+                break
+            except Exception, ex:
+                continue
+            self.handle(cmd)
 
     # -------------------------------------------------------------------------
     # 
@@ -396,5 +420,7 @@ class jobworker():
 
         if self.setup_core(): self.start_fuzzing()
 
+        self.running = False
+        l.join()
         self.stop_worker()
 
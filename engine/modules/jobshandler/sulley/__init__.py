@@ -93,6 +93,21 @@ def s_render ():
     return blocks.CURRENT.render()
 
 
+def s_seek (mutant_index):
+    '''
+    Jump the current request to the given mutation. The result is the same as calling s_mutate() mutant_index times on
+    a freshly initialized request, without having to step through all the preceding mutations.
+
+    @type  mutant_index: Integer
+    @param mutant_index: Number of mutations to advance from the starting state
+
+    @rtype:  Boolean
+    @return: True if the request holds a mutation, False if it is at its starting state or exhausted.
+    '''
+
+    return blocks.CURRENT.seek(mutant_index)
+
+
 def s_switch (name):
     '''
     Change the currect request to the one specified by "name".
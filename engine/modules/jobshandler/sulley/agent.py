@@ -3,6 +3,7 @@ import time
 import json
 import socket
 import select
+import struct
 
 from classes import DatabaseHandler as dh
 
@@ -26,7 +27,9 @@ class agent():
         @param session_id:   The ID of the job this agent connection belongs to
         @type  settings:     Dictionary
         @param settings:     The configuration settings used to communicate with
-                             the agent
+                             the agent. Setting "framing" to False skips the
+                             negotiation of length prefixed messages, for
+                             agents known not to support them.
         """
 
         self.root             = root
@@ -37,6 +40,9 @@ class agent():
         self.command          = None
         self.conn_retry       = 5
         self.conn_retry_delay = 20
+        self.timeout          = 5
+        self.framed           = False
+        self.framing          = None
         self.database         = dh.DatabaseHandler(self.config, self.root)
 
         if settings != None:
@@ -66,6 +72,12 @@ class agent():
             if "conn_retry_delay" in settings:
                 self.conn_retry_delay = settings["conn_retry_delay"]
 
+            if "timeout" in settings:
+                self.timeout = settings["timeout"]
+
+            if settings.get("framing") == False:
+                self.framing = False
+
         self.sock = None
         self.running = True
 
@@ -82,8 +94,7 @@ class agent():
 
     def check_alive(self):
         if self.sock == None: return False
-        message = json.dumps({"command": "ping"})
-        self.sock.send(message)
+        self.send(json.dumps({"command": "ping"}))
         data = self.check_response()
 
         if data == None: return False
@@ -101,8 +112,7 @@ class agent():
     def do_start(self):
         if self.sock == None: return False
         if not self.command: return False
-        message = json.dumps({"command": "start", "data": self.command})
-        self.sock.send(message)
+        self.send(json.dumps({"command": "start", "data": self.command}))
         data = self.check_response()
 
         if data == None: return False
@@ -145,8 +155,7 @@ class agent():
 
     def status(self):
         if self.sock == None: return None
-        message = json.dumps({"command": "status"})
-        self.sock.send(message)
+        self.send(json.dumps({"command": "status"}))
         data = self.check_response()
         if data == None or "command" not in data or \
            data["command"] != "status" or "data" not in data:
@@ -162,8 +171,7 @@ class agent():
 
     def kill(self):
         if self.sock == None: return None
-        message = json.dumps({"command": "kill"})
-        self.sock.send(message)
+        self.send(json.dumps({"command": "kill"}))
         data = self.check_response()
 
         if data == None: return False
@@ -187,6 +195,7 @@ class agent():
 
         try:
             self.sock.connect((self.address, self.port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         except Exception, ex:
             try: self.sock.close()
             except: pass
@@ -211,6 +220,7 @@ class agent():
                               self.session_id)
             c_stat = self.do_connect()
 
+        self.negotiate()
         if self.check_alive(): return True
 
         self.database.log("error",
@@ -224,7 +234,9 @@ class agent():
 
     def disconnect(self):
         if self.sock == None: return None
-        self.sock.shutdown(socket.SHUT_RDWR)
+        self.framed = False
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except: pass
         self.sock.close()
         self.sock = None
 
@@ -232,8 +244,134 @@ class agent():
     #
     # -----------------------------------------------------------------------------------
 
+    def negotiate(self):
+        """
+        Ask the agent to switch the connection to length prefixed messages.
+        Agents not supporting this either close the connection or ignore the
+        request. In both cases a new connection is opened which keeps using
+        unframed messages, a late response to the request would otherwise be
+        taken for the response to the next command. The result is kept, the
+        agent is not asked again when reconnecting.
+
+        @rtype:          Boolean
+        @return:         True if the agent accepted length prefixed messages
+        """
+
+        if self.sock == None: return False
+        self.framed = False
+        if self.framing == False: return False
+
+        try:
+            self.send(json.dumps({"command": "protocol", "data": "length"}))
+            data = self.recv_response()
+        except socket.error, ex:
+            data = None
+
+        if data != None and data.get("command") == "protocol" and \
+           data.get("data") == "length":
+            self.framed = True
+        else:
+            self.database.log("warning",
+                              "agent for job %s does not support framing" %\
+                              self.session_id)
+            self.do_connect()
+
+        self.framing = self.framed
+        return self.framed
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def send(self, message):
+        """
+        Send a message to the agent. Once negotiated, the message is prefixed
+        with its length as a 32 bit big endian integer.
+
+        @type  message:  String
+        @param message:  The JSON encoded message
+        """
+
+        if self.framed:
+            message = struct.pack(">I", len(message)) + message
+        self.sock.sendall(message)
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def recv_exact(self, length):
+        """
+        Read exactly length bytes from the agent.
+
+        @rtype:          String
+        @return:         The data read or None if the connection was closed
+        """
+
+        t_data = []
+        while length > 0:
+            data = self.sock.recv(min(length, 65536))
+            if not data: return None
+            t_data.append(data)
+            length -= len(data)
+        return ''.join(t_data)
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def recv_response(self):
+        """
+        Read an unframed response from the agent. Returns as soon as the data
+        received can be decoded as a JSON message or None if no complete
+        message arrived in time.
+        """
+
+        t_data = []
+        begin = time.time()
+        while True:
+            remaining = self.timeout - (time.time() - begin)
+            if remaining <= 0: return None
+            if not select.select([self.sock], [], [], remaining)[0]:
+                return None
+            data = self.sock.recv(4096)
+            if not data: return None
+            t_data.append(data)
+            try:
+                return json.loads(''.join(t_data))
+            except ValueError:
+                continue
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def recv_message(self):
+        """
+        Read a single length prefixed message from the agent. Returns as soon
+        as the message was received or None if it did not arrive in time.
+        """
+
+        self.sock.settimeout(self.timeout)
+        try:
+            header = self.recv_exact(4)
+            if header == None: return None
+            return self.recv_exact(struct.unpack(">I", header)[0])
+        except socket.timeout:
+            # the rest of a partially received message would be taken for
+            # the response to the next command
+            self.disconnect()
+            return None
+        finally:
+            if self.sock != None: self.sock.settimeout(None)
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
     def recv(self, timeout=1):
         if self.sock == None: return None
+        if self.framed: return self.recv_message()
         self.sock.setblocking(0)
 
         t_data = [];
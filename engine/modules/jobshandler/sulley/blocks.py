@@ -3,6 +3,7 @@ import primitives
 import sex
 
 import zlib
+import bisect
 import hashlib
 import struct
 
@@ -13,6 +14,143 @@ CURRENT  = None
 #
 # =============================================================================
 
+def invalidate_counts ():
+    '''
+    Discard the cached mutation counts of every request and block. Items pushed onto a request and strings added to the
+    string library invalidate the counts automatically, changing the values of a group or the fuzzable flag of an item
+    once the counts were calculated requires calling this.
+    '''
+
+    primitives.invalidate_counts()
+
+
+def stack_counts (container):
+    '''
+    Return the fuzzable items of a request or block stack along with the prefix sums of their mutation counts. The
+    table is calculated once and kept until the counts are invalidated.
+
+    @type  container: s_request or s_block
+    @param container: Request or block whose stack to count
+
+    @rtype:  Tuple
+    @return: The list of fuzzable items and the list of the total number of mutations up to and including each item
+    '''
+
+    if container.counts_generation != primitives.COUNTS_GENERATION:
+        items = [item for item in container.stack if item.fuzzable]
+        ends  = []
+        total = 0
+
+        for item in items:
+            total += item.num_mutations()
+            ends.append(total)
+
+        container.counts            = (items, ends)
+        container.counts_generation = primitives.COUNTS_GENERATION
+
+    return container.counts
+
+
+def seek_stack (container, mutant_index):
+    '''
+    Position the items of a request or block stack at the given mutation. The items preceding the one the mutation
+    belongs to are exhausted, the following items are expected to be in their starting state already.
+
+    @type  container:    s_request or s_block
+    @param container:    Request or block whose stack to position
+    @type  mutant_index: Integer
+    @param mutant_index: Mutation to jump to, counting from 1
+
+    @rtype:  Boolean
+    @return: True if an item of the stack holds the mutation, False otherwise.
+    '''
+
+    (items, ends) = stack_counts(container)
+    position      = bisect.bisect_left(ends, mutant_index)
+
+    for item in items[:position]:
+        item.exhaust()
+
+    container.mutate_pos = position
+
+    if position == len(items):
+        return False
+
+    item = items[position]
+    item.seek(mutant_index - (ends[position - 1] if position else 0))
+
+    if not isinstance(item, block):
+        container_request(container).mutant = item
+
+    return True
+
+
+def container_request (container):
+    '''
+    Return the request a request or block stack belongs to.
+    '''
+
+    if isinstance(container, block):
+        return container.request
+
+    return container
+
+
+def mutate_stack (container):
+    '''
+    Mutate the first item of a request or block stack which is not exhausted yet. The position of that item is kept, so
+    the items exhausted earlier are not stepped through again.
+
+    @type  container: s_request or s_block
+    @param container: Request or block whose stack to mutate
+
+    @rtype:  Boolean
+    @return: True if an item was mutated, False if the items of the stack are exhausted.
+    '''
+
+    items = stack_counts(container)[0]
+
+    while container.mutate_pos < len(items):
+        item = items[container.mutate_pos]
+
+        if item.mutate():
+            if not isinstance(item, block):
+                container_request(container).mutant = item
+
+            return True
+
+        container.mutate_pos += 1
+
+    return False
+
+
+def same_items (items, rendered_items):
+    '''
+    Compare the renderings of the items on a stack to the ones the stack was last merged from. Renderings are compared
+    by identity, items reuse their cached rendering as long as they did not change.
+
+    @type  items:          List
+    @param items:          Current renderings of the stack items
+    @type  rendered_items: List
+    @param rendered_items: Renderings of the stack items at the time of the last merge, None if never merged
+
+    @rtype:  Boolean
+    @return: True if none of the items changed, False if the stack has to be merged again.
+    '''
+
+    if rendered_items is None or len(items) != len(rendered_items):
+        return False
+
+    for index in xrange(len(items)):
+        if items[index] is not rendered_items[index]:
+            return False
+
+    return True
+
+# =============================================================================
+#
+# =============================================================================
+
 class request (pgraph.node):
     def __init__ (self, name):
         '''
@@ -23,35 +161,80 @@ class request (pgraph.node):
         @param name: Name of this request
         '''
 
-        self.name          = name
-
-        self.label         = name    # node label for graph rendering.
-        self.stack         = []      # the request stack.
-        self.block_stack   = []      # list of open blocks, -1 is last open block.
-        self.closed_blocks = {}      # dictionary of closed blocks.
-        self.callbacks     = {}      # dictionary of list of sizers / checksums that were unable to complete rendering.
-        self.names         = {}      # dictionary of directly accessible primitives.
-        self.rendered      = ""      # rendered block structure.
-        self.mutant_index  = 0       # current mutation index.
-        self.mutant        = None    # current primitive being mutated.
-        self.s_type        = "request"
+        self.name           = name
+
+        self.label          = name    # node label for graph rendering.
+        self.stack          = []      # the request stack.
+        self.block_stack    = []      # list of open blocks, -1 is last open block.
+        self.closed_blocks  = {}      # dictionary of closed blocks.
+        self.callbacks      = {}      # dictionary of list of sizers / checksums that were unable to complete rendering.
+        self.names          = {}      # dictionary of directly accessible primitives.
+        self.rendered       = ""      # rendered block structure.
+        self.rendered_items = None    # item renderings the rendered block structure was merged from.
+        self.mutant_index   = 0       # current mutation index.
+        self.mutant         = None    # current primitive being mutated.
+        self.mutate_pos     = 0       # position of the first fuzzable item not exhausted yet.
+        self.counts         = None    # fuzzable items and prefix sums of their mutation counts, see stack_counts().
+        self.counts_generation = None
+        self.seed           = None    # seed of the random primitives, see set_seed().
+        self.s_type         = "request"
 
     def mutate (self):
-        mutated = False
+        mutated = mutate_stack(self)
+
+        if mutated:
+            self.mutant_index += 1
+
+        return mutated
+
+
+    def exhaust (self):
+        '''
+        Exhaust the possible mutations of every item on the request stack.
+
+        @rtype:  Integer
+        @return: The number of mutations to reach exhaustion
+        '''
+
+        num = max(0, self.num_mutations() - self.mutant_index)
 
         for item in self.stack:
-            if item.fuzzable and item.mutate():
-                mutated = True
+            if item.fuzzable:
+                item.exhaust()
 
-                if not isinstance(item, block):
-                    self.mutant = item
+        self.mutant_index = self.num_mutations()
+        self.mutate_pos   = len(stack_counts(self)[0])
 
-                break
+        return num
 
-        if mutated:
-            self.mutant_index += 1
 
-        return mutated
+    def seek (self, mutant_index):
+        '''
+        Jump to the given mutation of the request. The resulting state is the same as the one reached by calling
+        mutate() mutant_index times on a freshly reset request, but it is calculated from the number of mutations of
+        the items on the stack instead of replaying every mutation.
+
+        @type  mutant_index: Integer
+        @param mutant_index: Number of mutations to advance from the starting state
+
+        @rtype:  Boolean
+        @return: True if the request holds a mutation, False if it is at its starting state or exhausted.
+        '''
+
+        self.reset()
+        self.mutant_index = 0
+
+        if mutant_index <= 0:
+            return False
+
+        if mutant_index > self.num_mutations():
+            self.exhaust()
+            return False
+
+        seek_stack(self, mutant_index)
+        self.mutant_index = mutant_index
+
+        return True
 
 
     def num_mutations (self):
@@ -62,13 +245,9 @@ class request (pgraph.node):
         @return: Number of mutated forms this primitive can take.
         '''
 
-        num_mutations = 0
+        ends = stack_counts(self)[1]
 
-        for item in self.stack:
-            if item.fuzzable:
-                num_mutations += item.num_mutations()
-
-        return num_mutations
+        return ends[-1] if ends else 0
 
 
     def pop (self):
@@ -96,6 +275,9 @@ class request (pgraph.node):
 
             self.names[item.name] = item
 
+        # the mutation counts of the request and the open blocks change.
+        invalidate_counts()
+
         # if there are no open blocks, the item gets pushed onto the request stack.
         # otherwise, the pushed item goes onto the stack of the last opened block.
         if not self.block_stack:
@@ -136,17 +318,28 @@ class request (pgraph.node):
                 update_size(b.stack, b.name)
                 b.render()
 
+            # the repeats and checksums were calculated before the sizes were updated.
+            for item in stack:
+                if isinstance(item, (repeat, checksum)):
+                    item.render()
+
         # call update_size on each block of the request
         for item in self.stack:
             if isinstance(item, block):
                 update_size(item.stack, item.name)
                 item.render()
 
-        # now collect, merge and return the rendered items.
-        self.rendered = ""
-
         for item in self.stack:
-            self.rendered += item.rendered
+            if isinstance(item, (repeat, checksum)):
+                item.render()
+
+        # now collect, merge and return the rendered items. items that did not change since the last render return
+        # their cached rendering, so the merge is skipped if none of them changed.
+        items = [item.rendered for item in self.stack]
+
+        if not same_items(items, self.rendered_items):
+            self.rendered       = "".join(items)
+            self.rendered_items = items
 
         return self.rendered
 
@@ -157,6 +350,7 @@ class request (pgraph.node):
         '''
 
         self.mutant_index  = 1
+        self.mutate_pos    = 0
         self.closed_blocks = {}
 
         for item in self.stack:
@@ -164,6 +358,24 @@ class request (pgraph.node):
                 item.reset()
 
 
+    def set_seed (self, seed):
+        '''
+        Seed the random primitives of the request. Each of them draws its mutations from a stream derived from the
+        seed, its position in the request and its mutant index, so a mutation renders the same whether it is reached
+        by stepping or by seeking, in this process or any other. With no seed they draw from os.urandom() instead. The
+        values already mutated are kept until the next mutate() or seek().
+
+        @type  seed: Any
+        @param seed: Seed, any value with a stable repr(), None to disable reproducible mutations
+        '''
+
+        self.seed = seed
+
+        for (position, item) in enumerate(self.walk()):
+            if hasattr(item, "seed"):
+                item.seed = None if seed == None else (seed, self.name, position)
+
+
     def walk (self, stack=None):
         '''
         Recursively walk through and yield every primitive and block on the request stack.
@@ -172,7 +384,7 @@ class request (pgraph.node):
         @return: Sulley Primitives
         '''
 
-        if not stack:
+        if stack == None:
             stack = self.stack
 
         for item in stack:
@@ -226,12 +438,17 @@ class block:
             raise sex.SullyRuntimeError("'%s' name has to be of type str" % self.s_type)
 
 
-        self.stack         = []     # block item stack.
-        self.rendered      = ""     # rendered block contents.
-        self.fuzzable      = True   # blocks are always fuzzable because they may contain fuzzable items.
-        self.group_idx     = 0      # if this block is tied to a group, the index within that group.
-        self.fuzz_complete = False  # whether or not we are done fuzzing this block.
-        self.mutant_index  = 0      # current mutation index.
+        self.stack          = []    # block item stack.
+        self.rendered       = ""    # rendered block contents.
+        self.rendered_items = None  # item renderings the rendered block contents were merged from.
+        self.rendered_stack = ""    # merged and encoded item renderings.
+        self.fuzzable       = True  # blocks are always fuzzable because they may contain fuzzable items.
+        self.group_idx      = 0     # if this block is tied to a group, the index within that group.
+        self.fuzz_complete  = False # whether or not we are done fuzzing this block.
+        self.mutant_index   = 0     # current mutation index.
+        self.mutate_pos     = 0     # position of the first fuzzable item not exhausted yet.
+        self.counts         = None  # fuzzable items and prefix sums of their mutation counts, see stack_counts().
+        self.counts_generation = None
 
 
     def mutate (self):
@@ -252,14 +469,7 @@ class block:
             self.request.names[self.group].value = self.request.names[self.group].values[self.group_idx]
 
             # mutate every item on the stack at the current group value.
-            for item in self.stack:
-                if item.fuzzable and item.mutate():
-                    mutated = True
-
-                    if not isinstance(item, block):
-                        self.request.mutant = item
-
-                    break
+            mutated = mutate_stack(self)
 
             # if the possible mutations for the stack are exhausted.
             if not mutated:
@@ -282,30 +492,18 @@ class block:
                         if item.fuzzable:
                             item.reset()
 
+                    self.mutate_pos = 0
+
                     # now mutate the first field in this block before continuing.
                     # (we repeat a test case if we don't mutate something)
-                    for item in self.stack:
-                        if item.fuzzable and item.mutate():
-                            mutated = True
-
-                            if not isinstance(item, block):
-                                self.request.mutant = item
-
-                            break
+                    mutated = mutate_stack(self)
 
         #
         # no grouping, mutate every item on the stack once.
         #
 
         else:
-            for item in self.stack:
-                if item.fuzzable and item.mutate():
-                    mutated = True
-
-                    if not isinstance(item, block):
-                        self.request.mutant = item
-
-                    break
+            mutated = mutate_stack(self)
 
         # if this block is dependant on another field, then manually update that fields value appropriately while we
         # mutate this block. we'll restore the original value of the field prior to continuing.
@@ -328,25 +526,94 @@ class block:
                 self.request.names[self.dep].value = self.request.names[self.dep].original_value
 
         if mutated:
-            if not isinstance(item, block):
-                self.request.mutant = item
+            self.mutant_index += 1
 
         return mutated
 
 
-    def num_mutations (self):
+    def exhaust (self):
         '''
-        Determine the number of repetitions we will be making.
+        Exhaust the possible mutations of every item on this blocks stack and restore the group and dependency values.
 
         @rtype:  Integer
-        @return: Number of mutated forms this primitive can take.
+        @return: The number of mutations to reach exhaustion
         '''
 
-        num_mutations = 0
+        num = max(0, self.num_mutations() - self.mutant_index)
 
         for item in self.stack:
             if item.fuzzable:
-                num_mutations += item.num_mutations()
+                item.exhaust()
+
+        if self.group:
+            self.group_idx = len(self.request.names[self.group].values)
+            self.request.names[self.group].value = self.request.names[self.group].original_value
+
+        if self.dep:
+            self.request.names[self.dep].value = self.request.names[self.dep].original_value
+
+        self.fuzz_complete = True
+        self.mutant_index  = self.num_mutations()
+        self.mutate_pos    = len(stack_counts(self)[0])
+
+        return num
+
+
+    def seek (self, mutant_index):
+        '''
+        Jump to the given mutation of this block, see request.seek(). If the block is tied to a group, every group
+        value covers the complete set of mutations of the stack.
+
+        @type  mutant_index: Integer
+        @param mutant_index: Number of mutations to advance from the starting state
+
+        @rtype:  Boolean
+        @return: True if the block holds a mutation, False otherwise.
+        '''
+
+        self.reset()
+
+        if mutant_index <= 0:
+            return False
+
+        if mutant_index > self.num_mutations():
+            self.exhaust()
+            return False
+
+        stack_index = mutant_index
+
+        if self.group:
+            ends            = stack_counts(self)[1]
+            stack_mutations = ends[-1] if ends else 0
+
+            self.group_idx = (mutant_index - 1) / stack_mutations
+            stack_index    = (mutant_index - 1) % stack_mutations + 1
+
+            self.request.names[self.group].value = self.request.names[self.group].values[self.group_idx]
+
+        seek_stack(self, stack_index)
+
+        if self.dep:
+            if self.dep_values:
+                self.request.names[self.dep].value = self.dep_values[0]
+            else:
+                self.request.names[self.dep].value = self.dep_value
+
+        self.mutant_index = mutant_index
+
+        return True
+
+
+    def num_mutations (self):
+        '''
+        Determine the number of repetitions we will be making.
+
+        @rtype:  Integer
+        @return: Number of mutated forms this primitive can take.
+        '''
+
+        ends          = stack_counts(self)[1]
+        num_mutations = ends[-1] if ends else 0
 
         # if this block is associated with a group, then multiply out the number of possible mutations.
         if self.group:
@@ -418,15 +685,18 @@ class block:
         for item in self.stack:
             item.render()
 
-        # now collect and merge the rendered items.
-        self.rendered = ""
+        # now collect and merge the rendered items, unless none of them changed since the last render.
+        items = [item.rendered for item in self.stack]
 
-        for item in self.stack:
-            self.rendered += item.rendered
+        if not same_items(items, self.rendered_items):
+            self.rendered_stack = "".join(items)
+            self.rendered_items = items
 
-        # if an encoder was attached to this block, call it.
-        if self.encoder:
-            self.rendered = self.encoder(self.rendered)
+            # if an encoder was attached to this block, call it.
+            if self.encoder:
+                self.rendered_stack = self.encoder(self.rendered_stack)
+
+        self.rendered = self.rendered_stack
 
         # the block is now closed, clear out all the entries from the request back splice dictionary.
         if self.request.callbacks.has_key(self.name):
@@ -441,6 +711,8 @@ class block:
 
         self.fuzz_complete = False
         self.group_idx     = 0
+        self.mutant_index  = 0
+        self.mutate_pos    = 0
 
         for item in self.stack:
             if item.fuzzable:
@@ -491,8 +763,10 @@ class checksum:
         if endian != ">" and endian != "<":
             raise sex.SullyRuntimeError("'%s' requires endian to be '>' or '<'" % self.s_type)
 
-        self.rendered   = ""
-        self.fuzzable   = False
+        self.rendered        = ""
+        self.rendered_block  = None     # block contents the checksum was last calculated over.
+        self.rendered_digest = ""       # checksum of the block contents.
+        self.fuzzable        = False
 
         if not self.length and self.checksum_lengths.has_key(self.algorithm):
             self.length = self.checksum_lengths[self.algorithm]
@@ -557,17 +831,24 @@ class checksum:
 
         self.rendered = ""
 
-        # if the target block for this sizer is already closed, render the checksum.
+        # if the target block for this sizer is already closed, render the checksum. it is only calculated again if
+        # the contents of the block changed since.
         if self.block_name in self.request.closed_blocks:
-            block_data    = self.request.closed_blocks[self.block_name].rendered
-            self.rendered = self.checksum(block_data)
+            block_data = self.request.closed_blocks[self.block_name].rendered
+
+            if block_data is not self.rendered_block:
+                self.rendered_block  = block_data
+                self.rendered_digest = self.checksum(block_data)
+
+            self.rendered = self.rendered_digest
 
         # otherwise, add this checksum block to the requests callback list.
         else:
             if not self.request.callbacks.has_key(self.block_name):
                 self.request.callbacks[self.block_name] = []
 
-            self.request.callbacks[self.block_name].append(self)
+            if self not in self.request.callbacks[self.block_name]:
+                self.request.callbacks[self.block_name].append(self)
 
 # =============================================================================
 #
@@ -633,6 +914,8 @@ class repeat:
         self.fuzz_library       = []                         # library of static fuzz heuristics to cycle through.
         self.mutant_index       = 0                          # current mutation number
         self.current_reps       = min_reps                   # current number of repetitions
+        self.rendered_block     = None                       # block contents the repeated value was built from
+        self.rendered_reps      = None                       # repetitions the repeated value was built from
 
         # ensure the target block exists.
         if self.block_name not in self.request.names:
@@ -716,11 +999,24 @@ class repeat:
         if self.block_name not in self.request.closed_blocks:
             raise sex.SullyRuntimeError("CAN NOT APPLY REPEATER TO UNCLOSED BLOCK: %s" % self.block_name)
 
-        # if a variable-bounding was specified then set the value appropriately.
-
+        # if a variable-bounding was specified then set the value appropriately. a mutated value is built again from
+        # the block as well, the block may have been rendered again since the mutation, ie: to update its sizes.
         if self.variable:
-            block      = self.request.closed_blocks[self.block_name]
-            self.value = block.rendered * self.variable.value
+            reps = self.variable.value
+        elif self.mutant_index and not self.fuzz_complete:
+            reps = self.current_reps
+        else:
+            reps = None
+
+        # it is only built again if the block contents or the repetitions changed.
+        if reps != None:
+            block = self.request.closed_blocks[self.block_name]
+
+            if block.rendered is not self.rendered_block or reps != self.rendered_reps or \
+               self.rendered is not self.value:
+                self.rendered_block = block.rendered
+                self.rendered_reps  = reps
+                self.value          = block.rendered * reps
 
         self.rendered = self.value
         return self.rendered
@@ -735,6 +1031,48 @@ class repeat:
         self.mutant_index   = 0
         self.value          = self.original_value
 
+
+    def exhaust (self):
+        '''
+        Exhaust the possible mutations for this primitive.
+
+        @rtype:  Integer
+        @return: The number of mutations to reach exhaustion
+        '''
+
+        num = self.num_mutations() - self.mutant_index
+
+        self.fuzz_complete  = True
+        self.mutant_index   = self.num_mutations()
+        self.value          = self.original_value
+        self.current_reps   = self.min_reps
+
+        return num
+
+
+    def seek (self, mutant_index):
+        '''
+        Jump to the given mutation, see primitives.base_primitive.seek().
+
+        @type  mutant_index: Integer
+        @param mutant_index: Number of mutations to advance from the starting state
+
+        @rtype:  Boolean
+        @return: True on success, False otherwise.
+        '''
+
+        self.reset()
+
+        if not self.fuzzable or mutant_index <= 0:
+            return False
+
+        if mutant_index > self.num_mutations():
+            self.exhaust()
+            return False
+
+        self.mutant_index = mutant_index - 1
+        return self.mutate()
+
 # =============================================================================
 #
 # =============================================================================
@@ -838,8 +1176,8 @@ class size:
 
         self.fuzz_complete          = True
         self.mutant_index           = self.num_mutations()
-        self.bit_field.mutant_index = self.num_mutations()
         self.value                  = self.original_value
+        self.bit_field.exhaust()
 
         return num
 
@@ -896,18 +1234,24 @@ class size:
             if self.inclusive: self_size = self.length
             else:              self_size = 0
 
-            block                = self.request.closed_blocks[self.block_name]
-            self.bit_field.value = self.math(len(block.rendered) + self_size + self.offset)
+            block = self.request.closed_blocks[self.block_name]
+            value = self.math(len(block.rendered) + self_size + self.offset)
             if self.synchsafe:
-                self.bit_field.value = self.t_synchsafe(self.bit_field.value)
-            self.rendered        = self.bit_field.render()
+                value = self.t_synchsafe(value)
+
+            # keep the bit field value if the size did not change, so its cached rendering is reused.
+            if value != self.bit_field.value:
+                self.bit_field.value = value
+
+            self.rendered = self.bit_field.render()
 
         # otherwise, add this sizer block to the requests callback list.
         else:
             if not self.request.callbacks.has_key(self.block_name):
                 self.request.callbacks[self.block_name] = []
 
-            self.request.callbacks[self.block_name].append(self)
+            if self not in self.request.callbacks[self.block_name]:
+                self.request.callbacks[self.block_name].append(self)
 
 
     def reset (self):
@@ -915,5 +1259,29 @@ class size:
         Wrap the reset routine of the internal bit_field primitive.
         '''
 
+        self.fuzz_complete = False
+        self.mutant_index  = 0
         self.bit_field.reset()
 
+
+    def seek (self, mutant_index):
+        '''
+        Wrap the seek routine of the internal bit_field primitive.
+
+        @type  mutant_index: Integer
+        @param mutant_index: Number of mutations to advance from the starting state
+
+        @rtype:  Boolean
+        @return: True on success, False otherwise.
+        '''
+
+        self.reset()
+
+        if mutant_index > self.num_mutations():
+            self.exhaust()
+            return False
+
+        self.mutant_index = max(0, mutant_index)
+
+        return self.bit_field.seek(mutant_index)
+
@@ -7,9 +7,17 @@ import abc
 import sys
 import json
 import time
+import errno
+import shlex
+import signal
 import socket
 import select
+import struct
+import tempfile
+import cStringIO
 
+import pack
+import mmsg
 from bluetooth import *
 
 # =============================================================================
@@ -38,6 +46,7 @@ class media:
         self.protos = protos
         self.socket = None
         self.target = None
+        self.case = None
 
     # -------------------------------------------------------------------------
     # The media_socket function should return the socket associated with the 
@@ -62,6 +71,18 @@ class media:
         else:
             self.target = target
 
+    # -------------------------------------------------------------------------
+    # The media_case function accepts the index of the test case about to be
+    # sent. Transport medias can use it to label the data they emit. If no
+    # index is given, it returns the index of the current test case.
+    # -------------------------------------------------------------------------
+
+    def media_case(self, index=None):
+        if index == None:
+            return self.case
+        else:
+            self.case = index
+
     # -------------------------------------------------------------------------
     # This function is responsible of building up a connection to the target
     # set via the media_target function.
@@ -118,6 +139,55 @@ class media:
         else:
             self.proto = proto
 
+    # -------------------------------------------------------------------------
+    # Medias running the target themselves can report the status of the
+    # target process after the last test case, in the same format as the
+    # agent does: "OK" if the target did not crash, otherwise a dictionary
+    # describing how it terminated. Other medias return None.
+    # -------------------------------------------------------------------------
+
+    def media_status(self):
+        return None
+
+    # -------------------------------------------------------------------------
+    # The media_close function is called once the session stopped sending
+    # test cases, to release anything the media kept between test cases.
+    # -------------------------------------------------------------------------
+
+    def media_close(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    # The media_reusable function tells whether the connection used for the
+    # last test case can be used to send the next one. Medias not supporting
+    # persistent connections return False.
+    # -------------------------------------------------------------------------
+
+    def media_reusable(self):
+        return False
+
+    # -------------------------------------------------------------------------
+    # The media_batch function tells whether the media can send a number of
+    # test cases at once using send_batch(). Medias not supporting it return
+    # False.
+    # -------------------------------------------------------------------------
+
+    def media_batch(self):
+        return False
+
+    # -------------------------------------------------------------------------
+    # The media_timeout function accepts the number of seconds to wait for
+    # the target, it applies to the current connection as well. If no timeout
+    # is given, it returns the current timeout.
+    # -------------------------------------------------------------------------
+
+    def media_timeout(self, timeout=None):
+        if timeout == None:
+            return self.timeout
+        self.timeout = timeout
+        if hasattr(self.socket, "settimeout"):
+            self.socket.settimeout(timeout)
+
 
 # =============================================================================
 # DRIVER FOR NETWORK
@@ -134,6 +204,7 @@ class network(media):
         self.target_address = None
         self.target_port = None
         self.connected = False
+        self.transceiver = None
 
     # -------------------------------------------------------------------------
     #
@@ -170,11 +241,32 @@ class network(media):
                               (self.target_address, self.target_port),
                              str(e)]
 
+    # -------------------------------------------------------------------------
+    # A TCP connection can be reused unless the target closed it. Data still
+    # waiting to be read, like a late response to the last test case, is
+    # discarded so it is not taken for the response to the next one.
+    # -------------------------------------------------------------------------
+
+    def media_reusable(self):
+        if self.socket == None: return False
+        if self.proto == "udp": return True
+        if not self.connected: return False
+
+        try:
+            while select.select([self.socket], [], [], 0)[0]:
+                if not self.socket.recv(65536): return False
+        except Exception, ex:
+            return False
+
+        return True
+
     # -------------------------------------------------------------------------
     #
     # -------------------------------------------------------------------------
 
     def disconnect(self):
+        self.connected = False
+        self.transceiver = None
         try:
             self.socket.shutdown(2)
         except Exception, ex:
@@ -215,31 +307,65 @@ class network(media):
                 raise Exception, ["failed to send data", str(e)]
 
     # -------------------------------------------------------------------------
-    #
+    # UDP test cases can be sent in batches, see send_batch().
     # -------------------------------------------------------------------------
 
-    def disconnect(self):
-        try:
-            self.socket.shutdown(2)
-        except Exception, ex:
-            raise Exception(ex)
+    def media_batch(self):
+        return self.proto == "udp"
+
+    # -------------------------------------------------------------------------
+    # Send a batch of datagrams over a long-lived socket connected to the
+    # target, then wait for as many responses as datagrams sent. The
+    # responses are returned in the order they arrived.
+    # -------------------------------------------------------------------------
+
+    def send_batch(self, messages):
+        if self.transceiver == None or \
+           self.transceiver.count < len(messages):
+            if self.socket != None:
+                try:
+                    self.disconnect()
+                except Exception, ex:
+                    pass
+            self.connect()
+            try:
+                self.socket.connect((self.target_address, self.target_port))
+            except Exception, e:
+                raise Exception, ["failed to connect to target %s:%d" %
+                                  (self.target_address, self.target_port),
+                                 str(e)]
+            self.transceiver = mmsg.transceiver(self.socket, len(messages))
+
+        MAX_UDP = 65507
+        if os.name != "nt" and os.uname()[0] == "Darwin":
+            MAX_UDP = 9216
 
         try:
-            self.socket.close()
-        except Exception, ex:
-            pass
-        self.socket = None
+            self.transceiver.drain()
+            self.transceiver.send([m[:MAX_UDP] for m in messages])
+        except Exception, e:
+            self.transceiver = None
+            raise Exception, ["failed to send data", str(e)]
 
+        try:
+            return self.transceiver.receive(len(messages), self.timeout)
+        except Exception, e:
+            # an error is pending on the socket, such as the target port
+            # being unreachable.
+            self.transceiver = None
+            return []
 
     # -------------------------------------------------------------------------
     #
     # -------------------------------------------------------------------------
 
-    def send(self, data):
+    def media_close(self):
+        if self.socket == None: return
         try:
-            self.socket.send(data)
-        except Exception, e:
-            raise Exception, ["failed to send data", str(e)]
+            self.disconnect()
+        except Exception, ex:
+            pass
+
 
 # =============================================================================
 # DRIVER FOR BLUETOOTH
@@ -303,6 +429,21 @@ class bluetooth(media):
 # DRIVER FOR FILE
 # =============================================================================
 
+# -----------------------------------------------------------------------------
+# By default each test case is written to a file of its own. Setting "mode"
+# to "pack" in the target appends the test cases to segmented pack files
+# instead, see pack.py, which can be read using tools/packreader.py:
+#
+#     {
+#         "path": "/tmp/cases",
+#         "filename": "case",
+#         "extension": "bin",
+#         "mode": "pack",
+#         "segment_size": 268435456,
+#         "fsync": "segment"
+#     }
+# -----------------------------------------------------------------------------
+
 class file(media):
 
     # -------------------------------------------------------------------------
@@ -317,24 +458,43 @@ class file(media):
         self.f_name = None
         self.f_ext = None
         self.p_sub = None
+        self.pack = None
+        self.p_case = None
 
     # -------------------------------------------------------------------------
     #
     # -------------------------------------------------------------------------
 
     def connect(self):
+        # name the file after the test case if known so workers sharing the
+        # path and resumed jobs do not overwrite each other's files.
+        counter = self.session_counter
+        if self.case != None: counter = self.case
+
+        if self.target.get('mode') == "pack":
+            if self.pack == None:
+                self.pack = pack.writer(self.target['path'],
+                                        self.target['filename'],
+                                        self.target.get('segment_size',
+                                                        pack.SEGMENT_SIZE),
+                                        self.target.get('fsync', "segment"))
+            self.p_case = counter
+            self.socket = cStringIO.StringIO()
+            return
+
         self.f_path = self.target['path']
         self.f_name = self.target['filename']
         self.f_ext = self.target['extension']
         if not os.path.exists(self.f_path): os.makedirs(self.f_path)
-        subdir = self.f_path + "/" + str(self.session_counter / 1000)
+
+        subdir = self.f_path + "/" + str(counter / 1000)
         if subdir != self.p_sub:
             self.p_sub = subdir
             if not os.path.exists(subdir): os.makedirs(subdir)
 
         try:
             f_full = self.p_sub + "/" + self.f_name + "." + \
-                     str(self.session_counter) + \
+                     str(counter) + \
                      "." + self.f_ext
 
             self.socket = open(f_full, 'w')
@@ -357,10 +517,14 @@ class file(media):
     # -------------------------------------------------------------------------
 
     def disconnect(self):
+        if self.pack != None and self.socket != None:
+            self.pack.append(self.p_case, self.socket.getvalue())
+
         try:
             self.socket.close()
         except Exception, ex:
             pass
+        if self.pack != None: self.socket = None
 
     # -------------------------------------------------------------------------
     #
@@ -373,6 +537,454 @@ class file(media):
     #
     # -------------------------------------------------------------------------
 
+    def media_close(self):
+        if self.pack == None: return
+        self.pack.close()
+        self.pack = None
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
     def media_socket(self):
         return self.socket
 
+# =============================================================================
+# DRIVER FOR LOCAL PROCESSES
+# =============================================================================
+
+# -----------------------------------------------------------------------------
+# The process media runs a local target binary for each test case sent. The
+# target is described as:
+#
+#     {
+#         "command": "/usr/bin/target -x @@",
+#         "forkserver": "/path/to/libfuzzlabsforkserver.so",
+#         "file": "/tmp/case.bin",
+#         "environment": {"NAME": "value"}
+#     }
+#
+# The protocol selects how the test case is passed to the target: "stdin"
+# feeds it on the standard input, "file" writes it to a file whose path
+# replaces "@@" in the command. If "forkserver" points to the library built
+# from agents/FuzzlabsForkServer, the target is started only once and forked
+# right before main() for each test case. Otherwise, or if the target does
+# not complete the handshake, each test case is a fork and exec.
+# -----------------------------------------------------------------------------
+
+FORKSRV_CTL_FD = 198
+FORKSRV_ST_FD  = 199
+FORKSRV_HELLO  = "FLFS"
+
+# Where signals have aliases, the common name sorts first and wins.
+SIGNAL_NAMES   = dict((getattr(signal, name), name)
+                      for name in reversed(sorted(dir(signal)))
+                      if name.startswith("SIG") and not name.startswith("SIG_"))
+
+class process(media):
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, bind=None, timeout=5.0):
+        media.__init__(self, bind, timeout, ["stdin", "file"])
+
+        self.command = None
+        self.environment = None
+        self.case_path = None
+        self.case_fd = None
+        self.server_pid = None
+        self.ctl_fd = None
+        self.st_fd = None
+        self.forkserver = True
+        self.status = None
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def connect(self):
+        if self.case_fd == None:
+            try:
+                self.setup()
+            except Exception, e:
+                raise Exception, ["failed to set up target process", str(e)]
+
+        if self.forkserver and self.server_pid == None:
+            self.start_forkserver()
+
+    # -------------------------------------------------------------------------
+    # Process the target details and create the file holding the test case.
+    # -------------------------------------------------------------------------
+
+    def setup(self):
+        self.case_path = self.target.get('file')
+        if not self.case_path:
+            (fd, self.case_path) = tempfile.mkstemp(prefix="fuzzlabs-case-")
+            os.close(fd)
+        self.case_fd = os.open(self.case_path,
+                               os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0600)
+
+        self.command = [str(arg) for arg in shlex.split(self.target['command'])]
+        if self.proto == "file":
+            self.command = [arg.replace("@@", self.case_path)
+                            for arg in self.command]
+
+        self.environment = dict(os.environ)
+        for (name, value) in self.target.get('environment', {}).items():
+            self.environment[str(name)] = str(value)
+
+        library = self.target.get('forkserver')
+        if not library:
+            self.forkserver = False
+        else:
+            preload = self.environment.get('LD_PRELOAD')
+            self.environment['LD_PRELOAD'] = str(library) + \
+                (":" + preload if preload else "")
+
+    # -------------------------------------------------------------------------
+    # Start the target in a child process. The descriptors are arranged as
+    # passed in fds, all other descriptors are closed.
+    # -------------------------------------------------------------------------
+
+    def spawn(self, fds):
+        pid = os.fork()
+        if pid != 0: return pid
+
+        try:
+            for (target, source) in fds.items():
+                os.dup2(source, target)
+            if os.path.isdir("/proc/self/fd"):
+                open_fds = [int(fd) for fd in os.listdir("/proc/self/fd")]
+            else:
+                open_fds = range(3, os.sysconf("SC_OPEN_MAX"))
+            for fd in open_fds:
+                if fd > 2 and fd not in fds:
+                    try: os.close(fd)
+                    except OSError: pass
+            os.execve(self.command[0], self.command, self.environment)
+        finally:
+            os._exit(127)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def input_fds(self):
+        null = os.open(os.devnull, os.O_RDWR)
+        stdin = self.case_fd if self.proto == "stdin" else null
+        return (null, {0: stdin, 1: null, 2: null})
+
+    # -------------------------------------------------------------------------
+    # Start the fork server. If the target does not say hello in time it was
+    # not loaded with the fork server library, so fall back to fork and exec.
+    # -------------------------------------------------------------------------
+
+    def start_forkserver(self):
+        (ctl_r, ctl_w) = os.pipe()
+        (st_r, st_w) = os.pipe()
+        (null, fds) = self.input_fds()
+        fds[FORKSRV_CTL_FD] = ctl_r
+        fds[FORKSRV_ST_FD] = st_w
+
+        try:
+            self.server_pid = self.spawn(fds)
+        finally:
+            for fd in [ctl_r, st_w, null]: os.close(fd)
+
+        self.ctl_fd = ctl_w
+        self.st_fd = st_r
+
+        hello = self.read_status(4, max(self.timeout, 1.0))
+        if hello != FORKSRV_HELLO:
+            self.stop_forkserver()
+            self.forkserver = False
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def stop_forkserver(self):
+        for fd in [self.ctl_fd, self.st_fd]:
+            try:
+                os.close(fd)
+            except Exception, ex:
+                pass
+        self.ctl_fd = None
+        self.st_fd = None
+
+        if self.server_pid == None: return
+        try:
+            os.kill(self.server_pid, signal.SIGKILL)
+        except OSError, ex:
+            pass
+        try:
+            os.waitpid(self.server_pid, 0)
+        except OSError, ex:
+            pass
+        self.server_pid = None
+
+    # -------------------------------------------------------------------------
+    # Read from the fork server, None if it did not respond in time or exited.
+    # -------------------------------------------------------------------------
+
+    def read_status(self, size, timeout):
+        data = ""
+        deadline = time.time() + timeout
+        while len(data) < size:
+            remaining = deadline - time.time()
+            if remaining <= 0: return None
+            try:
+                if not select.select([self.st_fd], [], [], remaining)[0]:
+                    return None
+                chunk = os.read(self.st_fd, size - len(data))
+            except (OSError, select.error), ex:
+                if ex.args[0] == errno.EINTR: continue
+                return None
+            if not chunk: return None
+            data += chunk
+        return data
+
+    # -------------------------------------------------------------------------
+    # Run a test case using the fork server. Returns the wait status of the
+    # target and whether it had to be killed because it timed out.
+    # -------------------------------------------------------------------------
+
+    def run_forkserver(self):
+        try:
+            os.write(self.ctl_fd, struct.pack("I", 0))
+        except OSError, ex:
+            self.stop_forkserver()
+            raise Exception, ["fork server is not running", str(ex)]
+
+        pid = self.read_status(4, max(self.timeout, 1.0))
+        if pid == None:
+            self.stop_forkserver()
+            raise Exception, ["fork server failed to start target", ""]
+        pid = struct.unpack("i", pid)[0]
+
+        timed_out = False
+        status = self.read_status(4, self.timeout)
+        if status == None:
+            timed_out = True
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError, ex:
+                pass
+            status = self.read_status(4, max(self.timeout, 1.0))
+            if status == None:
+                self.stop_forkserver()
+                raise Exception, ["fork server did not report status", ""]
+
+        return (pid, struct.unpack("i", status)[0], timed_out)
+
+    # -------------------------------------------------------------------------
+    # Run a test case by starting the target from scratch.
+    # -------------------------------------------------------------------------
+
+    def run_exec(self):
+        # The target holds the write end of the pipe, which gets closed when
+        # it exits. Waiting for the read end to become readable is a wait for
+        # the target with a timeout. The descriptor used is the one of the
+        # fork server control channel, the fork server library does not touch
+        # it unless the handshake succeeded.
+        (exit_r, exit_w) = os.pipe()
+        (null, fds) = self.input_fds()
+        fds[FORKSRV_CTL_FD] = exit_w
+        try:
+            os.lseek(self.case_fd, 0, os.SEEK_SET)
+            pid = self.spawn(fds)
+        finally:
+            os.close(null)
+            os.close(exit_w)
+
+        exited = False
+        try:
+            try:
+                exited = bool(select.select([exit_r], [], [], self.timeout)[0])
+            except select.error, ex:
+                pass
+        finally:
+            os.close(exit_r)
+
+        # the descriptors are closed right before the target turns into a
+        # zombie, so only a blocking wait is guaranteed to see it exited.
+        timed_out = False
+        if exited:
+            (w_pid, status) = os.waitpid(pid, 0)
+        else:
+            (w_pid, status) = os.waitpid(pid, os.WNOHANG)
+        if w_pid != pid:
+            timed_out = True
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError, ex:
+                pass
+            (w_pid, status) = os.waitpid(pid, 0)
+
+        return (pid, status, timed_out)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def send(self, data):
+        try:
+            os.ftruncate(self.case_fd, 0)
+            os.lseek(self.case_fd, 0, os.SEEK_SET)
+            os.write(self.case_fd, data)
+        except Exception, e:
+            raise Exception, ["failed to write test case", str(e)]
+
+        if self.forkserver and self.server_pid != None:
+            (pid, status, timed_out) = self.run_forkserver()
+        else:
+            (pid, status, timed_out) = self.run_exec()
+
+        self.status = {
+            "status": "terminated",
+            "process_id": pid,
+            "exit_code": -1,
+            "signal_num": -1,
+            "signal_str": "",
+            "timeout": timed_out
+        }
+        if os.WIFEXITED(status):
+            self.status["exit_code"] = os.WEXITSTATUS(status)
+        if os.WIFSIGNALED(status):
+            self.status["signal_num"] = os.WTERMSIG(status)
+            self.status["signal_str"] = SIGNAL_NAMES.get(os.WTERMSIG(status),
+                                                         "")
+
+    # -------------------------------------------------------------------------
+    # A test case killed by a signal, other than the one sent on a timeout,
+    # is reported as a failure to receive a response.
+    # -------------------------------------------------------------------------
+
+    def recv(self, size):
+        if self.status == None or self.status["timeout"]:
+            raise Exception("target did not finish in time")
+        if self.status["signal_num"] != -1:
+            raise Exception("target terminated by %s" %
+                            self.status["signal_str"])
+        return("OK")
+
+    # -------------------------------------------------------------------------
+    # The target is still considered to be running if it timed out.
+    # -------------------------------------------------------------------------
+
+    def media_status(self):
+        if self.status == None or self.status["timeout"]:
+            return "OK"
+        if self.status["signal_num"] == -1:
+            return "OK"
+        return self.status
+
+    # -------------------------------------------------------------------------
+    # The fork server is kept running between test cases.
+    # -------------------------------------------------------------------------
+
+    def disconnect(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def media_close(self):
+        self.stop_forkserver()
+        if self.case_fd == None: return
+        os.close(self.case_fd)
+        self.case_fd = None
+        if not self.target.get('file'):
+            try:
+                os.unlink(self.case_path)
+            except OSError, ex:
+                pass
+
+# =============================================================================
+# DRIVER FOR LOOPBACK
+# =============================================================================
+
+# -----------------------------------------------------------------------------
+# The loopback media does not talk to a target, the test cases are discarded
+# in memory and a canned response is returned for each of them. It is meant
+# to measure the throughput of the engine itself, see tools/benchmark.py and
+# tools/echo_server.py for measuring it against a local network target. The
+# target is described as:
+#
+#     {
+#         "response": "OK",
+#         "echo": false
+#     }
+#
+# If "echo" is set the test case is returned as the response instead.
+# -----------------------------------------------------------------------------
+
+class loopback(media):
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, bind=None, timeout=0):
+        media.__init__(self, bind, timeout, ["loopback"])
+
+        self.response = "OK"
+        self.echo = False
+        self.last_sent = ""
+        self.cases = 0
+        self.bytes = 0
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def connect(self):
+        if self.target:
+            self.response = str(self.target.get('response', "OK"))
+            self.echo = bool(self.target.get('echo', False))
+        self.socket = cStringIO.StringIO()
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def send(self, data):
+        if (self.socket == None):
+            self.connect()
+        self.last_sent = data
+        self.cases += 1
+        self.bytes += len(data)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def recv(self, size):
+        if self.echo: return self.last_sent[:size]
+        return self.response[:size]
+
+    # -------------------------------------------------------------------------
+    # There is no connection to lose, it is kept between test cases.
+    # -------------------------------------------------------------------------
+
+    def media_reusable(self):
+        return self.socket != None
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def media_batch(self):
+        return True
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def send_batch(self, messages):
+        for message in messages: self.send(message)
+        if self.echo: return list(messages)
+        return [self.response] * len(messages)
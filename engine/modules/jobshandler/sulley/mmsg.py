@@ -0,0 +1,207 @@
+# =============================================================================
+# Batched datagram transmission
+# =============================================================================
+
+import time
+import errno
+import select
+import socket
+import ctypes
+import ctypes.util
+
+# -----------------------------------------------------------------------------
+# sendmmsg(2) and recvmmsg(2) move a batch of datagrams with a single system
+# call. Where the C library does not provide them, the datagrams are sent and
+# received one by one.
+# -----------------------------------------------------------------------------
+
+MSG_DONTWAIT = 0x40
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len",  ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [("msg_name",       ctypes.c_void_p),
+                ("msg_namelen",    ctypes.c_uint32),
+                ("msg_iov",        ctypes.POINTER(iovec)),
+                ("msg_iovlen",     ctypes.c_size_t),
+                ("msg_control",    ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags",      ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr),
+                ("msg_len", ctypes.c_uint)]
+
+LIBC = None
+try:
+    LIBC = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    LIBC.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr),
+                              ctypes.c_uint, ctypes.c_int]
+    LIBC.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr),
+                              ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+except Exception, ex:
+    LIBC = None
+
+# =============================================================================
+#
+# =============================================================================
+
+class transceiver:
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, sock, count, size=65535):
+        '''
+        Send and receive batches of datagrams on a connected datagram socket.
+
+        @type  sock:  socket
+        @param sock:  The connected datagram socket
+        @type  count: Integer
+        @param count: The maximum number of datagrams in a batch
+        @type  size:  Integer
+        @param size:  (Optional, def=65535) The maximum size of a datagram received
+        '''
+
+        self.sock    = sock
+        self.count   = count
+        self.size    = size
+        self.batched = LIBC != None
+
+        if not self.batched: return
+
+        # the receive buffers are set up once and reused for every batch.
+        self.r_buffers = [ctypes.create_string_buffer(size) for i in range(count)]
+        self.r_iovecs  = (iovec * count)()
+        self.r_headers = (mmsghdr * count)()
+        for i in range(count):
+            self.r_iovecs[i].iov_base = ctypes.addressof(self.r_buffers[i])
+            self.r_iovecs[i].iov_len  = size
+            self.r_headers[i].msg_hdr.msg_iov    = ctypes.pointer(self.r_iovecs[i])
+            self.r_headers[i].msg_hdr.msg_iovlen = 1
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def send(self, messages):
+        '''
+        Send the datagrams, in order.
+
+        @type  messages: List
+        @param messages: The datagrams to send
+        '''
+
+        if not self.batched:
+            for message in messages: self.sock.send(message)
+            return
+
+        total   = len(messages)
+        buffers = [ctypes.create_string_buffer(message, len(message))
+                   for message in messages]
+        iovecs  = (iovec * total)()
+        headers = (mmsghdr * total)()
+        for i in range(total):
+            iovecs[i].iov_base = ctypes.addressof(buffers[i])
+            iovecs[i].iov_len  = len(messages[i])
+            headers[i].msg_hdr.msg_iov    = ctypes.pointer(iovecs[i])
+            headers[i].msg_hdr.msg_iovlen = 1
+
+        # the call may send only part of the batch.
+        sent = 0
+        while sent < total:
+            first = ctypes.cast(ctypes.addressof(headers) +
+                                sent * ctypes.sizeof(mmsghdr),
+                                ctypes.POINTER(mmsghdr))
+            rc = LIBC.sendmmsg(self.sock.fileno(), first, total - sent, 0)
+            if rc < 0:
+                error = ctypes.get_errno()
+                if error == errno.EINTR: continue
+                raise socket.error(error, "sendmmsg() failed")
+            sent += rc
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def receive_ready(self, limit):
+        '''
+        Receive the datagrams waiting on the socket, without blocking.
+
+        @type  limit: Integer
+        @param limit: The maximum number of datagrams to receive
+
+        @rtype:  List
+        @return: The datagrams received
+        '''
+
+        received = []
+        if not self.batched:
+            # a socket with a timeout waits for data even if asked not to.
+            while len(received) < limit and \
+                  select.select([self.sock], [], [], 0)[0]:
+                try:
+                    received.append(self.sock.recv(self.size, MSG_DONTWAIT))
+                except socket.error, ex:
+                    if ex.args[0] in [errno.EAGAIN, errno.EWOULDBLOCK]: break
+                    raise
+            return received
+
+        while len(received) < limit:
+            count = min(limit - len(received), self.count)
+            rc = LIBC.recvmmsg(self.sock.fileno(), self.r_headers, count,
+                               MSG_DONTWAIT, None)
+            if rc < 0:
+                error = ctypes.get_errno()
+                if error == errno.EINTR: continue
+                if error in [errno.EAGAIN, errno.EWOULDBLOCK]: break
+                raise socket.error(error, "recvmmsg() failed")
+            for i in range(rc):
+                received.append(self.r_buffers[i].raw[:self.r_headers[i].msg_len])
+            if rc < count: break
+        return received
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def receive(self, expected, timeout):
+        '''
+        Receive datagrams until the expected number of them arrived or the time
+        is up.
+
+        @type  expected: Integer
+        @param expected: The number of datagrams to wait for
+        @type  timeout:  Float
+        @param timeout:  The maximum number of seconds to wait
+
+        @rtype:  List
+        @return: The datagrams received, in the order they arrived
+        '''
+
+        received = []
+        deadline = time.time() + timeout
+        while len(received) < expected:
+            remaining = deadline - time.time()
+            if remaining <= 0: break
+            try:
+                if not select.select([self.sock], [], [], remaining)[0]: break
+            except select.error, ex:
+                if ex.args[0] == errno.EINTR: continue
+                raise
+            received += self.receive_ready(expected - len(received))
+        return received
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def drain(self):
+        '''
+        Discard late responses to an earlier batch.
+        '''
+
+        while self.receive_ready(self.count): pass
@@ -0,0 +1,255 @@
+# =============================================================================
+# Test case packs
+# =============================================================================
+
+import os
+import re
+import struct
+
+# -----------------------------------------------------------------------------
+# A pack stores test cases appended to large segment files instead of a file
+# per test case. Each segment consists of two files named after the index of
+# the first test case stored in it:
+#
+#     <name>.<first index>.pack   the test cases, one after the other
+#     <name>.<first index>.idx    a record per test case: the test case index,
+#                                 the offset and the length of the test case
+#                                 in the pack file, as big endian unsigned
+#                                 64, 64 and 32 bit integers
+#
+# The pack file is always flushed before the index, so an index record never
+# points past the data written.
+# -----------------------------------------------------------------------------
+
+INDEX_RECORD    = struct.Struct(">QQI")
+SEGMENT_SIZE    = 256 * 1048576
+BUFFER_SIZE     = 1048576
+FSYNC_POLICIES  = ["never", "segment", "case"]
+
+# =============================================================================
+#
+# =============================================================================
+
+class writer:
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, path, name, segment_size=SEGMENT_SIZE, fsync="segment"):
+        '''
+        Append test cases to a pack.
+
+        @type  path:         String
+        @param path:         The directory holding the pack
+        @type  name:         String
+        @param name:         The name of the pack, the prefix of the segments
+        @type  segment_size: Integer
+        @param segment_size: (Optional, def=256MB) The size of the pack file at
+                             which a new segment is started
+        @type  fsync:        String
+        @param fsync:        (Optional, def="segment") When to sync the segments
+                             to disk: "never", when a "segment" is complete or
+                             after each test "case"
+        '''
+
+        if fsync not in FSYNC_POLICIES:
+            raise Exception, ["invalid fsync policy: %s" % fsync, ""]
+
+        self.path         = path
+        self.name         = name
+        self.segment_size = int(segment_size)
+        self.fsync        = fsync
+        self.data         = None
+        self.index        = None
+        self.offset       = 0
+
+        if not os.path.exists(self.path): os.makedirs(self.path)
+
+    # -------------------------------------------------------------------------
+    # Open a new segment starting with the test case identified by index. A
+    # resumed job may start from the first test case of an existing segment,
+    # in that case the segment is appended to.
+    # -------------------------------------------------------------------------
+
+    def open_segment(self, index):
+        base = os.path.join(self.path, "%s.%d" % (self.name, index))
+        self.data = open(base + ".pack", "ab", BUFFER_SIZE)
+        self.index = open(base + ".idx", "ab", BUFFER_SIZE)
+        self.offset = os.fstat(self.data.fileno()).st_size
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def close_segment(self):
+        if self.data == None: return
+        self.flush(self.fsync != "never")
+        self.data.close()
+        self.index.close()
+        self.data = None
+        self.index = None
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def append(self, index, data):
+        '''
+        Append a test case to the pack.
+
+        @type  index: Integer
+        @param index: The index of the test case
+        @type  data:  String
+        @param data:  The test case
+        '''
+
+        if self.data == None: self.open_segment(index)
+
+        self.data.write(data)
+        self.index.write(INDEX_RECORD.pack(index, self.offset, len(data)))
+        self.offset += len(data)
+
+        if self.offset >= self.segment_size:
+            self.close_segment()
+        elif self.fsync == "case":
+            self.flush(True)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def flush(self, sync=False):
+        '''
+        Write the buffered test cases of the current segment.
+
+        @type  sync: Boolean
+        @param sync: (Optional, def=False) Also sync the segment to disk
+        '''
+
+        if self.data == None: return
+        for f in [self.data, self.index]:
+            f.flush()
+            if sync: os.fsync(f.fileno())
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def close(self):
+        self.close_segment()
+
+# =============================================================================
+#
+# =============================================================================
+
+class reader:
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self, path, name):
+        '''
+        Read test cases from a pack.
+
+        @type  path: String
+        @param path: The directory holding the pack
+        @type  name: String
+        @param name: The name of the pack, the prefix of the segments
+        '''
+
+        self.path = path
+        self.name = name
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def segments(self):
+        '''
+        @rtype:  List
+        @return: The (first index, base path) of the segments, ordered by the
+                 index of the first test case
+        '''
+
+        pattern = re.compile("^" + re.escape(self.name) + r"\.(\d+)\.idx$")
+        segments = []
+        for filename in os.listdir(self.path):
+            match = pattern.match(filename)
+            if not match: continue
+            base = os.path.join(self.path, filename[:-len(".idx")])
+            segments.append((int(match.group(1)), base))
+        segments.sort()
+        return segments
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def records(self, base):
+        '''
+        Iterate over the index of a segment. Records pointing past the end of
+        the pack file, left behind if the writer was killed, are skipped.
+
+        @type  base: String
+        @param base: The base path of the segment
+
+        @rtype:  Generator
+        @return: (index, offset, length) of the test cases in the segment
+        '''
+
+        size = os.path.getsize(base + ".pack")
+        index = open(base + ".idx", "rb")
+        try:
+            while True:
+                record = index.read(INDEX_RECORD.size)
+                if len(record) < INDEX_RECORD.size: break
+                (case, offset, length) = INDEX_RECORD.unpack(record)
+                if offset + length > size: break
+                yield (case, offset, length)
+        finally:
+            index.close()
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def entries(self):
+        '''
+        @rtype:  Generator
+        @return: (index, base path, offset, length) of every test case
+        '''
+
+        for (first, base) in self.segments():
+            for (case, offset, length) in self.records(base):
+                yield (case, base, offset, length)
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def read(self, index):
+        '''
+        Read a test case. Segments are searched starting with the last one
+        which could hold the test case, as workers sharing a pack write
+        segments of their own.
+
+        @type  index: Integer
+        @param index: The index of the test case
+
+        @rtype:  String
+        @return: The test case or None if it is not in the pack
+        '''
+
+        candidates = [s for s in self.segments() if s[0] <= index]
+        for (first, base) in reversed(candidates):
+            for (case, offset, length) in self.records(base):
+                if case != index: continue
+                data = open(base + ".pack", "rb")
+                try:
+                    data.seek(offset)
+                    return data.read(length)
+                finally:
+                    data.close()
+        return None
@@ -25,11 +25,16 @@ import edge
 import cluster
 
 import copy
+import bisect
 
 class graph (object):
     '''
     @todo: Add support for clusters
-    @todo: Potentially swap node list with a node dictionary for increased performance
+
+    The edges from and to each node and the nodes by name are indexed, so traversing the graph does not have to scan
+    every edge and node. The indexes are maintained by the add_*, del_* and update_node_id() routines, the nodes and
+    edges must not be added to or removed from the dictionaries directly. The edges from or to a node are kept ordered
+    by edge id.
     '''
 
     ####################################################################################################################
@@ -41,6 +46,9 @@ class graph (object):
         self.clusters	= []
         self.edges	= {}
         self.nodes	= {}
+        self.edges_src	= {}
+        self.edges_dst	= {}
+        self.names	= {}
 
     ####################################################################################################################
     def add_cluster (self, cluster):
@@ -73,7 +81,11 @@ class graph (object):
 
         # ensure the source and destination nodes exist.
         if self.find_node("id", edge.src) and self.find_node("id", edge.dst):
+            if self.edges.has_key(edge.id):
+                self.unindex_edge(self.edges[edge.id])
+
             self.edges[edge.id] = edge
+            self.index_edge(edge)
 
         return self
 
@@ -107,6 +119,10 @@ class graph (object):
         if not self.nodes.has_key(node.id):
             self.nodes[node.id] = node
 
+            name = getattr(node, "name", None)
+            if name != None and not self.names.has_key(name):
+                self.names[name] = node
+
         return self
 
 
@@ -150,6 +166,7 @@ class graph (object):
             id = (src << 32) + dst
 
         if self.edges.has_key(id):
+            self.unindex_edge(self.edges[id])
             del self.edges[id]
 
         return self
@@ -181,8 +198,18 @@ class graph (object):
         '''
 
         if self.nodes.has_key(id):
+            node = self.nodes[id]
             del self.nodes[id]
 
+            # another node of the same name, if any, takes over the name.
+            name = getattr(node, "name", None)
+            if name != None and self.names.get(name) is node:
+                del self.names[name]
+                for other in self.nodes.values():
+                    if getattr(other, "name", None) == name:
+                        self.names[name] = other
+                        break
+
         return self
 
 
@@ -198,7 +225,7 @@ class graph (object):
         @return: List of edges from the specified node
         '''
 
-        return [edge for edge in self.edges.values() if edge.src == id]
+        return list(self.edges_src.get(id, []))
 
 
     ####################################################################################################################
@@ -213,7 +240,7 @@ class graph (object):
         @return: List of edges to the specified node
         '''
 
-        return [edge for edge in self.edges.values() if edge.dst == id]
+        return list(self.edges_dst.get(id, []))
 
 
     ####################################################################################################################
@@ -303,10 +330,13 @@ class graph (object):
         @return: Node, if attribute / value pair is matched. None otherwise.
         '''
 
-        # if the attribute to search for is the id, simply return the node from the internal hash.
+        # if the attribute to search for is the id or the name, simply return the node from the internal hash.
         if attribute == "id" and self.nodes.has_key(value):
             return self.nodes[value]
 
+        elif attribute == "name":
+            return self.names.get(value)
+
         # step through all the nodes looking for the given attribute/value pair.
         else:
             for node in self.nodes.values():
@@ -643,7 +673,11 @@ class graph (object):
         self.nodes[node.id] = node
 
         # update the edges.
-        for edge in [edge for edge in self.edges.values() if current_id in (edge.src, edge.dst)]:
+        edges = self.edges_src.get(current_id, []) + \
+                [edge for edge in self.edges_dst.get(current_id, []) if edge.src != current_id]
+
+        for edge in edges:
+            self.unindex_edge(edge)
             del self.edges[edge.id]
 
             if edge.src == current_id:
@@ -653,7 +687,42 @@ class graph (object):
 
             edge.id = (edge.src << 32) + edge.dst
 
+            if self.edges.has_key(edge.id):
+                self.unindex_edge(self.edges[edge.id])
+
             self.edges[edge.id] = edge
+            self.index_edge(edge)
+
+
+    ####################################################################################################################
+    def index_edge (self, edge):
+        '''
+        Add an edge to the lists of edges from its source and to its destination, keeping them ordered by edge id.
+
+        @type  edge: pGRAPH Edge
+        @param edge: Edge to index
+        '''
+
+        for (index, key) in ((self.edges_src, edge.src), (self.edges_dst, edge.dst)):
+            edges = index.setdefault(key, [])
+            edges.insert(bisect.bisect([e.id for e in edges], edge.id), edge)
+
+
+    ####################################################################################################################
+    def unindex_edge (self, edge):
+        '''
+        Remove an edge from the lists of edges from its source and to its destination.
+
+        @type  edge: pGRAPH Edge
+        @param edge: Edge to remove from the index
+        '''
+
+        for (index, key) in ((self.edges_src, edge.src), (self.edges_dst, edge.dst)):
+            edges = [e for e in index.get(key, []) if e is not edge]
+            if edges:
+                index[key] = edges
+            elif index.has_key(key):
+                del index[key]
 
 
     ####################################################################################################################
@@ -1,10 +1,82 @@
+import os
 import random
 import struct
 import blocks
 import zlib
 import copy
+import hashlib
 import sex
 
+COUNTS_GENERATION = 0   # bumped whenever the cached mutation counts of requests and blocks may be outdated.
+
+# =============================================================================
+#
+# =============================================================================
+
+def invalidate_counts ():
+    '''
+    Discard the cached mutation counts of every request and block. Kept here rather than in blocks as the string library
+    is filled while this module is still being imported.
+    '''
+
+    global COUNTS_GENERATION
+    COUNTS_GENERATION += 1
+
+
+def derive_seed (seed, *key):
+    '''
+    Derive a seed from another seed and a key, the same seed and key always derive the same seed.
+
+    @type  seed: Any
+    @param seed: Seed to derive from, any value with a stable repr()
+    @type  key:  Any
+    @param key:  Values telling apart the seeds derived from the same seed, ie: the mutation index
+
+    @rtype:  String
+    @return: The derived seed, as a hex digest
+    '''
+
+    return hashlib.sha1(repr((seed,) + key)).hexdigest()
+
+
+def random_stream (seed, *key):
+    '''
+    Return a random number generator whose state is derived from the seed and the key, the same seed and key always
+    produce the same sequence.
+
+    @type  seed: Any
+    @param seed: Seed of the stream, any value with a stable repr()
+    @type  key:  Any
+    @param key:  Values telling apart the streams derived from the same seed, ie: the mutation index
+
+    @rtype:  random.Random
+    @return: The random number generator
+    '''
+
+    return random.Random(int(derive_seed(seed, *key), 16))
+
+
+def random_bytes (generator, length):
+    '''
+    Draw a string of random bytes in bulk, from the generator if given, from os.urandom() otherwise.
+
+    @type  generator: random.Random
+    @param generator: Random number generator to draw from, None for os.urandom()
+    @type  length:    Integer
+    @param length:    Number of bytes to draw
+
+    @rtype:  String
+    @return: The random bytes
+    '''
+
+    if length <= 0:
+        return ""
+
+    if generator == None:
+        return os.urandom(length)
+
+    return ("%0*x" % (length * 2, generator.getrandbits(length * 8))).decode("hex")
+
 # =============================================================================
 #
 # =============================================================================
@@ -14,6 +86,9 @@ class base_primitive (object):
     The primitive base class implements common functionality shared across most primitives.
     '''
 
+    dirty          = True       # this flag is raised when the primitive has to be rendered again.
+    rendered_value = None       # value the cached rendering of the primitive was produced from.
+
     def __init__ (self):
         self.fuzz_complete  = False     # this flag is raised when the mutations are exhausted.
         self.fuzz_library   = []        # library of static fuzz heuristics to cycle through.
@@ -36,9 +111,21 @@ class base_primitive (object):
         self.fuzz_complete  = True
         self.mutant_index   = self.num_mutations()
         self.value          = self.original_value
+        self.dirty          = True
 
         return num
 
+    def changed (self):
+        '''
+        Determine whether the cached rendering of the primitive is outdated. Besides the dirty flag raised on reset,
+        the value is compared by identity to catch mutations and values assigned directly (groups, dependencies).
+
+        @rtype:  Boolean
+        @return: True if the primitive has to be rendered again, False otherwise.
+        '''
+
+        return self.dirty or self.value is not self.rendered_value
+
     def mutate (self):
         '''
         Mutate the primitive by stepping through the fuzz library, return False on completion.
@@ -90,6 +177,43 @@ class base_primitive (object):
         self.fuzz_complete  = False
         self.mutant_index   = 0
         self.value          = self.original_value
+        self.dirty          = True
+
+    def restore_state (self, mutant_index):
+        '''
+        Restore the internal counters to the state reached after the given number of mutations, without updating the
+        value. Primitives keeping track of more than the mutation index have to override this.
+
+        @type  mutant_index: Integer
+        @param mutant_index: Number of mutations performed since the last reset
+        '''
+
+        self.mutant_index   = mutant_index
+
+    def seek (self, mutant_index):
+        '''
+        Jump to the given mutation. The resulting state is identical to the one reached by calling mutate()
+        mutant_index times after a reset, but it is derived from the index instead of replaying the mutations.
+
+        @type  mutant_index: Integer
+        @param mutant_index: Number of mutations to advance from the starting state
+
+        @rtype:  Boolean
+        @return: True if the primitive holds a mutated value, False otherwise.
+        '''
+
+        self.reset()
+
+        if not self.fuzzable or mutant_index <= 0:
+            return False
+
+        if mutant_index > self.num_mutations():
+            self.exhaust()
+            return False
+
+        # restore the state right before the requested mutation and step into it.
+        self.restore_state(mutant_index - 1)
+        return self.mutate()
 
 # =============================================================================
 #
@@ -317,6 +441,7 @@ class random_data (base_primitive):
         self.rendered      = ""             # rendered value
         self.fuzz_complete = False          # flag if this primitive has been completely fuzzed
         self.mutant_index  = 0              # current mutation number
+        self.seed          = None           # seed of the random stream, see request.set_seed(). None for os.urandom().
 
         if self.step:
             self.max_mutations = (self.max_length - self.min_length) / self.step + 1
@@ -339,17 +464,21 @@ class random_data (base_primitive):
             self.value = self.original_value
             return False
 
+        # when seeded, the mutation is derived from the seed and the mutant index alone, so it can be reproduced.
+        if self.seed != None:
+            generator = random_stream(self.seed, self.mutant_index)
+        else:
+            generator = None
+
         # select a random length for this string.
         if not self.step:
-            length = random.randint(self.min_length, self.max_length)
+            length = (generator or random).randint(self.min_length, self.max_length)
         # select a length function of the mutant index and the step.
         else:
             length = self.min_length + self.mutant_index * self.step
 
-        # reset the value and generate a random string of the determined length.
-        self.value = ""
-        for i in xrange(length):
-            self.value += chr(random.randint(0, 255))
+        # generate a random string of the determined length.
+        self.value = random_bytes(generator, length)
 
         # increment the mutation count.
         self.mutant_index += 1
@@ -526,36 +655,294 @@ class binary (base_primitive):
             return True
         return self.integer_tests()
 
-    def num_mutations (self):
-        # calculate the mutations for single-byte mutations.
-        mutations = (len(self.original_value) * len(self.payloads))
+    def reset (self):
+        self.fuzz_complete  = False
+        self.mutant_index   = 0
+        self.current_pos    = 0
+        self.current_val    = 0
+        self.i_position     = 0
+        self.edge_case_cnt  = 0
+        self.value          = copy.deepcopy(self.original_value)
+        self.dirty          = True
+
+    def changed (self):
+        '''
+        Every mutation starts off a fresh copy of the original value and the bytes may be updated in place, so compare
+        the contents instead of the identity.
+        '''
+
+        return self.dirty or self.value != self.rendered_value
+
+    def restore_state (self, mutant_index):
+        byte_mutations = len(self.original_value) * len(self.payloads)
+        self.mutant_index = mutant_index
+
+        if not mutant_index:
+            return
 
-        # update the number of mutations additional test cases
-        for position in range(0, len(self.original_value)):
-            for edge_case in self.edge_cases:
-                mutations += 1
-        return mutations
+        # still replacing single bytes.
+        if mutant_index <= byte_mutations:
+            self.current_pos   = (mutant_index - 1) / len(self.payloads)
+            self.current_val   = (mutant_index - 1) % len(self.payloads) + 1
+            return
+
+        # byte replacement is over, working through the integer edge cases.
+        tests = mutant_index - byte_mutations
+        self.current_pos   = len(self.original_value)
+        self.current_val   = 0
+        self.i_position    = (tests - 1) / len(self.edge_cases)
+        self.edge_case_cnt = (tests - 1) % len(self.edge_cases) + 1
+
+    def num_mutations (self):
+        # the single-byte mutations followed by the integer edge cases at every position.
+        return len(self.original_value) * (len(self.payloads) + len(self.edge_cases))
 
     def render (self):
-        self.rendered = ""
-        for r_byte in self.value:
-            self.rendered += chr(r_byte)
+        if not self.changed():
+            return self.rendered
+
+        self.rendered       = "".join(map(chr, self.value))
+        self.rendered_value = list(self.value)
+        self.dirty          = False
+
         return self.rendered
 
 # =============================================================================
 #
 # =============================================================================
 
+class string_library (object):
+    '''
+    Library of fuzz strings shared across string primitives. Long strings made of a repeated sequence are stored as a
+    (sequence, length) pair and only materialised when accessed, other strings are stored as is.
+    '''
+
+    def __init__ (self, items=None):
+        '''
+        @type  items: List
+        @param items: (Optional, def=None) Strings and (sequence, length) pairs to initialize the library with
+        '''
+
+        self.items     = items or []    # library items, strings or (sequence, length) pairs.
+        self.truncated = {}             # copies of the library truncated to a maximum length, keyed by the length.
+
+
+    def __getitem__ (self, index):
+        return self.materialise(self.items[index])
+
+
+    def __len__ (self):
+        return len(self.items)
+
+
+    def add_long_strings (self, sequence):
+        '''
+        Given a sequence, add a number of selectively chosen strings lengths of the given sequence to the library.
+
+        @type  sequence: String
+        @param sequence: Sequence to repeat for creation of fuzz strings.
+        '''
+
+        for length in [128, 255, 256, 257, 511, 512, 513, 1023, 1024, 2048, 2049, 4095, 4096, 4097, 5000, 10000, 15000,
+                       20000, 25000, 32762, 32763, 32764, 32765, 32766, 32767, 32768, 32769, 0xFFFF-2, 0xFFFF-1,
+                       0xFFFF, 0xFFFF+1, 0xFFFF+2, 99999, 100000, 500000, 1000000]:
+
+            self.items.append((sequence, len(sequence) * length))
+
+        invalidate_counts()
+
+
+    def append (self, item):
+        '''
+        Add a string or a (sequence, length) pair to the library.
+        '''
+
+        self.items.append(item)
+        invalidate_counts()
+
+
+    def length (self, index):
+        '''
+        Return the length of a library item without materialising it.
+
+        @type  index: Integer
+        @param index: Index of the library item
+
+        @rtype:  Integer
+        @return: Length of the string
+        '''
+
+        item = self.items[index]
+
+        if type(item) is tuple:
+            return item[1]
+
+        return len(item)
+
+
+    def materialise (self, item, max_len=0):
+        '''
+        Build the string stored as a library item.
+
+        @type  item:    String or Tuple
+        @param item:    The library item
+        @type  max_len: Integer
+        @param max_len: (Optional, def=0) Maximum string length
+
+        @rtype:  String
+        @return: The string
+        '''
+
+        if type(item) is not tuple:
+            if max_len > 0:
+                return item[:max_len]
+            return item
+
+        (sequence, length) = item
+
+        if max_len > 0:
+            length = min(length, max_len)
+
+        return (sequence * (length / len(sequence) + 1))[:length]
+
+
+    def truncate (self, max_len):
+        '''
+        Return the library with the strings longer than max_len cut to max_len and duplicates removed. The truncated
+        library is cached, primitives sharing the same max_len share it as well.
+
+        @type  max_len: Integer
+        @param max_len: Maximum string length
+
+        @rtype:  string_library
+        @return: The truncated library, or the library itself if none of the strings are longer than max_len
+        '''
+
+        if not any(self.length(index) > max_len for index in xrange(len(self.items))):
+            return self
+
+        if max_len not in self.truncated:
+            strings = set([self.materialise(item, max_len) for item in self.items])
+            self.truncated[max_len] = string_library(list(strings))
+
+        return self.truncated[max_len]
+
+
+def build_string_library ():
+    '''
+    Build the library of smart fuzz values global across all string primitives. This happens once when the module is
+    loaded, so forked workers share the library of the process that spawned them.
+
+    @rtype:  string_library
+    @return: The library
+    '''
+
+    items = \
+    [
+        # omission.
+        "",
+
+        # strings ripped from spike (and some others I added)
+        "/.:/"  + "A"*5000 + "\x00\x00",
+        "/.../" + "A"*5000 + "\x00\x00",
+        "/.../.../.../.../.../.../.../.../.../.../",
+        "/../../../../../../../../../../../../etc/passwd",
+        "/../../../../../../../../../../../../boot.ini",
+        "..:..:..:..:..:..:..:..:..:..:..:..:..:",
+        "\\\\*",
+        "\\\\?\\",
+        "/\\" * 5000,
+        "/." * 5000,
+        "!@#$%%^#$%#$@#$%$$@#$%^^**(()",
+        "%01%02%03%04%0a%0d%0aADSF",
+        "%01%02%03@%04%0a%0d%0aADSF",
+        "/%00/",
+        "%00/",
+        "%00",
+        "%u0000",
+        "%\xfe\xf0%\x00\xff",
+        "%\xfe\xf0%\x01\xff" * 20,
+
+        # format strings.
+        "%n"     * 100,
+        "%n"     * 500,
+        "\"%n\"" * 500,
+        "%s"     * 100,
+        "%s"     * 500,
+        "\"%s\"" * 500,
+
+        # command injection.
+        "|touch /tmp/SULLEY",
+        ";touch /tmp/SULLEY;",
+        "|notepad",
+        ";notepad;",
+        "\nnotepad\n",
+
+        # SQL injection.
+        "1;SELECT%20*",
+        "'sqlattempt1",
+        "(sqlattempt2)",
+        "OR%201=1",
+
+        # some binary strings.
+        "\xde\xad\xbe\xef",
+        "\xde\xad\xbe\xef" * 10,
+        "\xde\xad\xbe\xef" * 100,
+        "\xde\xad\xbe\xef" * 1000,
+        "\xde\xad\xbe\xef" * 10000,
+        "\x00"             * 1000,
+
+        # miscellaneous.
+        "\r\n" * 100,
+        "<>" * 500,         # sendmail crackaddr (http://lsd-pl.net/other/sendmail.txt)
+    ]
+
+    library = string_library(items)
+
+    # Add some long strings
+    longs = ["A", "B", "1", "2", "3", "<", ">", "'", "\"", "/", "\\", "?",
+             "=", "a=", "&", ".", ",", "(", ")", "]", "[", "%", "*", "-",
+             "_", "+", "{", "}", "%s", "%d", "%n", "\x14", "\xFE", "\xFF"]
+
+    for to_long in longs:
+        library.add_long_strings(to_long)
+
+    # add some long strings with null bytes thrown in the middle of it.
+    for length in [128, 256, 1024, 2048, 4096, 10000, 15000, 20000, 25000, 32767, 50000, 0xFFFF]:
+        s = "B" * length
+        s = s[:len(s)/2] + "\x00" + s[len(s)/2:]
+        library.append(s)
+
+    # if the optional file '.fuzz_strings' is found, parse each line as a new entry for the fuzz library.
+    try:
+        fh = open(".fuzz_strings", "r")
+
+        for fuzz_string in fh.readlines():
+            fuzz_string = fuzz_string.rstrip("\r\n")
+
+            if fuzz_string != "":
+                library.append(fuzz_string)
+
+        fh.close()
+    except:
+        pass
+
+    return library
+
+# =============================================================================
+#
+# =============================================================================
+
 class string (base_primitive):
-    # store fuzz_library as a class variable to avoid copying the ~70MB structure across each instantiated primitive.
-    fuzz_library = []
+    # store fuzz_library as a class variable to avoid copying the structure across each instantiated primitive.
+    fuzz_library = build_string_library()
 
     def __init__ (self, value, size=-1, padding="\x00", encoding="ascii", compression=None, fuzzable=True, max_len=0, name=None):
         '''
         Primitive that cycles through a library of "bad" strings. The class variable 'fuzz_library' contains a list of
         smart fuzz values global across all instances. The 'this_library' variable contains fuzz values specific to
-        the instantiated primitive. This allows us to avoid copying the near ~70MB fuzz_library data structure across
-        each instantiated primitive.
+        the instantiated primitive. This allows us to avoid copying the fuzz_library data structure across each
+        instantiated primitive.
 
         @type  value:    String
         @param value:    Default string value
@@ -618,103 +1005,19 @@ class string (base_primitive):
             self.value * 100 + "\xfe",
         ]
 
-        # if the fuzz library has not yet been initialized, do so with all the global values.
-        if not self.fuzz_library:
-            string.fuzz_library  = \
-            [
-                # omission.
-                "",
-
-                # strings ripped from spike (and some others I added)
-                "/.:/"  + "A"*5000 + "\x00\x00",
-                "/.../" + "A"*5000 + "\x00\x00",
-                "/.../.../.../.../.../.../.../.../.../.../",
-                "/../../../../../../../../../../../../etc/passwd",
-                "/../../../../../../../../../../../../boot.ini",
-                "..:..:..:..:..:..:..:..:..:..:..:..:..:",
-                "\\\\*",
-                "\\\\?\\",
-                "/\\" * 5000,
-                "/." * 5000,
-                "!@#$%%^#$%#$@#$%$$@#$%^^**(()",
-                "%01%02%03%04%0a%0d%0aADSF",
-                "%01%02%03@%04%0a%0d%0aADSF",
-                "/%00/",
-                "%00/",
-                "%00",
-                "%u0000",
-                "%\xfe\xf0%\x00\xff",
-                "%\xfe\xf0%\x01\xff" * 20,
-
-                # format strings.
-                "%n"     * 100,
-                "%n"     * 500,
-                "\"%n\"" * 500,
-                "%s"     * 100,
-                "%s"     * 500,
-                "\"%s\"" * 500,
-
-                # command injection.
-                "|touch /tmp/SULLEY",
-                ";touch /tmp/SULLEY;",
-                "|notepad",
-                ";notepad;",
-                "\nnotepad\n",
-
-                # SQL injection.
-                "1;SELECT%20*",
-                "'sqlattempt1",
-                "(sqlattempt2)",
-                "OR%201=1",
-
-                # some binary strings.
-                "\xde\xad\xbe\xef",
-                "\xde\xad\xbe\xef" * 10,
-                "\xde\xad\xbe\xef" * 100,
-                "\xde\xad\xbe\xef" * 1000,
-                "\xde\xad\xbe\xef" * 10000,
-                "\x00"             * 1000,
-
-                # miscellaneous.
-                "\r\n" * 100,
-                "<>" * 500,         # sendmail crackaddr (http://lsd-pl.net/other/sendmail.txt)
-            ]
-
-            # Add some long strings
-            longs = ["A", "B", "1", "2", "3", "<", ">", "'", "\"", "/", "\\", "?",
-                     "=", "a=", "&", ".", ",", "(", ")", "]", "[", "%", "*", "-",
-                     "_", "+", "{", "}", "%s", "%d", "%n", "\x14", "\xFE", "\xFF"]
-
-            for to_long in longs:
-                self.add_long_strings(to_long)
-
-            # add some long strings with null bytes thrown in the middle of it.
-            for length in [128, 256, 1024, 2048, 4096, 10000, 15000, 20000, 25000, 32767, 50000, 0xFFFF]:
-                s = "B" * length
-                s = s[:len(s)/2] + "\x00" + s[len(s)/2:]
-                string.fuzz_library.append(s)
-
-            # if the optional file '.fuzz_strings' is found, parse each line as a new entry for the fuzz library.
-            try:
-                fh = open(".fuzz_strings", "r")
-
-                for fuzz_string in fh.readlines():
-                    fuzz_string = fuzz_string.rstrip("\r\n")
-
-                    if fuzz_string != "":
-                        string.fuzz_library.append(fuzz_string)
-
-                fh.close()
-            except:
-                pass
-
         # delete strings which length is greater than max_len.
         if max_len > 0:
             if any(len(s) > max_len for s in self.this_library):
                 self.this_library = list(set([s[:max_len] for s in self.this_library]))
 
-            if any(len(s) > max_len for s in self.fuzz_library):
-                self.fuzz_library = list(set([s[:max_len] for s in self.fuzz_library]))
+            self.fuzz_library = self.fuzz_library.truncate(max_len)
+
+        # a static sized string can only take the library items shorter than its size, keep track of their positions
+        # so the number of mutations is accurate and mutations can be addressed directly.
+        self.sized_index = []
+        if self.size != -1:
+            self.sized_index  = [i for i in xrange(len(self.fuzz_library)) if self.fuzz_library.length(i) < self.size]
+            self.sized_index += [len(self.fuzz_library) + i for i, s in enumerate(self.this_library) if len(s) < self.size]
 
 
     def add_long_strings (self, sequence):
@@ -726,12 +1029,7 @@ class string (base_primitive):
         @param sequence: Sequence to repeat for creation of fuzz strings.
         '''
 
-        for length in [128, 255, 256, 257, 511, 512, 513, 1023, 1024, 2048, 2049, 4095, 4096, 4097, 5000, 10000, 15000,
-                       20000, 25000, 32762, 32763, 32764, 32765, 32766, 32767, 32768, 32769, 0xFFFF-2, 0xFFFF-1,
-                       0xFFFF, 0xFFFF+1, 0xFFFF+2, 99999, 100000, 500000, 1000000]:
-
-            long_string = sequence * length
-            string.fuzz_library.append(long_string)
+        string.fuzz_library.add_long_strings(sequence)
 
 
     def mutate (self):
@@ -743,34 +1041,33 @@ class string (base_primitive):
         @return: True on success, False otherwise.
         '''
 
-        # loop through the fuzz library until a suitable match is found.
-        while 1:
-            # if we've ran out of mutations, raise the completion flag.
-            if self.mutant_index == self.num_mutations():
-                self.fuzz_complete = True
-
-            # if fuzzing was disabled or complete, and mutate() is called, ensure the original value is restored.
-            if not self.fuzzable or self.fuzz_complete:
-                self.value = self.original_value
-                return False
-
-            # update the current value from the fuzz library.
-            self.value = (self.fuzz_library + self.this_library)[self.mutant_index]
+        # if we've ran out of mutations, raise the completion flag.
+        if self.mutant_index == self.num_mutations():
+            self.fuzz_complete = True
 
-            # increment the mutation count.
-            self.mutant_index += 1
+        # if fuzzing was disabled or complete, and mutate() is called, ensure the original value is restored.
+        if not self.fuzzable or self.fuzz_complete:
+            self.value = self.original_value
+            return False
 
-            # if the size parameter is disabled, break out of the loop right now.
-            if self.size == -1:
-                break
+        # update the current value from the fuzz library extended with the "this" library, static sized strings only
+        # step through the items that fit.
+        if self.size == -1:
+            index = self.mutant_index
+        else:
+            index = self.sized_index[self.mutant_index]
 
-            # ignore library items greather then user-supplied length.
-            if len(self.value) > self.size: self.value = self.value[0:self.size]
+        if index < len(self.fuzz_library):
+            self.value = self.fuzz_library[index]
+        else:
+            self.value = self.this_library[index - len(self.fuzz_library)]
 
+        if self.size != -1:
             # pad undersized library items.
-            if len(self.value) < self.size:
-                self.value = self.value + self.padding * (self.size - len(self.value))
-                break
+            self.value = self.value + self.padding * (self.size - len(self.value))
+
+        # increment the mutation count.
+        self.mutant_index += 1
 
         return True
 
@@ -783,6 +1080,9 @@ class string (base_primitive):
         @return: Number of mutated forms this primitive can take
         '''
 
+        if self.size != -1:
+            return len(self.sized_index)
+
         return len(self.fuzz_library) + len(self.this_library)
 
 
@@ -791,6 +1091,9 @@ class string (base_primitive):
         Render the primitive, encode the string according to the specified encoding.
         '''
 
+        if not self.changed():
+            return self.rendered
+
         if self.compression == "zlib":
             try:
                 self.rendered = zlib.compress(str(self.value))
@@ -803,12 +1106,24 @@ class string (base_primitive):
         except:
             self.rendered = self.value
 
+        self.rendered_value = self.value
+        self.dirty          = False
+
         return self.rendered
 
 # =============================================================================
 #
 # =============================================================================
 
+# -----------------------------------------------------------------------------
+# Precompiled structures rendering the bit fields of the common widths, keyed
+# by endianess and width.
+# -----------------------------------------------------------------------------
+
+BIT_FIELD_STRUCTS = dict(((endian, width), struct.Struct(endian + code))
+                         for endian in "<>"
+                         for (width, code) in [(8, "B"), (16, "H"), (32, "L"), (64, "Q")])
+
 class bit_field (base_primitive):
     def __init__ (self, value, width, max_num=None, endian="<", format="binary", signed=False, full_range=False, fuzzable=True, name=None, synchsafe=False):
         '''
@@ -896,6 +1211,7 @@ class bit_field (base_primitive):
         self.fuzz_complete = False     # flag if this primitive has been completely fuzzed
         self.fuzz_library  = []        # library of fuzz heuristics
         self.mutant_index  = 0         # current mutation number
+        self.cyclic_index  = 0         # next value to render from a list of values
 
         if self.max_num == None:
             self.max_num = self.to_decimal("1" + "0" * width)
@@ -974,31 +1290,32 @@ class bit_field (base_primitive):
         Render the primitive.
         '''
 
+        # a list of values is cycled through on every render, so it can not be cached.
+        if not self.changed() and type(self.value) not in [list, tuple]:
+            return self.rendered
+
         #
         # binary formatting.
         #
 
         if self.format == "binary":
-            bit_stream = ""
-            rendered   = ""
+            # only the low width bits of the value are rendered, padded to the next byte boundary.
+            number = self.next_value() & ((1 << self.width) - 1)
+            packer = BIT_FIELD_STRUCTS.get((self.endian, self.width))
 
-            # pad the bit stream to the next byte boundary.
-            if self.width % 8 == 0:
-                bit_stream += self.to_binary()
+            if packer:
+                rendered = packer.pack(number)
             else:
-                bit_stream  = "0" * (8 - (self.width % 8))
-                bit_stream += self.to_binary()
+                rendered = bytearray((self.width + 7) / 8)
+                for i in xrange(len(rendered) - 1, -1, -1):
+                    rendered[i] = number & 0xFF
+                    number >>= 8
 
-            # convert the bit stream from a string of bits into raw bytes.
-            for i in xrange(len(bit_stream) / 8):
-                chunk = bit_stream[8*i:8*i+8]
-                rendered += struct.pack("B", self.to_decimal(chunk))
+                # if necessary, convert the endianess of the raw bytes.
+                if self.endian == "<":
+                    rendered.reverse()
 
-            # if necessary, convert the endianess of the raw bytes.
-            if self.endian == "<":
-                rendered = list(rendered)
-                rendered.reverse()
-                rendered = "".join(rendered)
+                rendered = str(rendered)
 
             self.rendered = rendered
 
@@ -1024,6 +1341,9 @@ class bit_field (base_primitive):
             else:
                 self.rendered = "%d" % self.value
 
+        self.rendered_value = self.value
+        self.dirty          = False
+
         return self.rendered
 
 
@@ -1041,21 +1361,32 @@ class bit_field (base_primitive):
         '''
 
         if number == None:
-            if type(self.value) in [list, tuple]:
-                # We have been given a list to cycle through that is not being mutated...
-                if self.cyclic_index == len(self.value):
-                    # Reset the index.
-                    self.cyclic_index = 0
-                number = self.value[self.cyclic_index]
-                self.cyclic_index += 1
-            else:
-                number = self.value
+            number = self.next_value()
 
         if bit_count == None:
             bit_count = self.width
 
         return "".join(map(lambda x:str((number >> x) & 1), range(bit_count -1, -1, -1)))
 
+    def next_value (self):
+        '''
+        Return the value to render. If the value is a list of values, they are cycled through on every call.
+
+        @rtype:  Integer
+        @return: The value to render
+        '''
+
+        if type(self.value) in [list, tuple]:
+            # We have been given a list to cycle through that is not being mutated...
+            if self.cyclic_index == len(self.value):
+                # Reset the index.
+                self.cyclic_index = 0
+            number = self.value[self.cyclic_index]
+            self.cyclic_index += 1
+            return number
+
+        return self.value
+
     def to_decimal (self, binary):
         '''
         Convert a binary string to a decimal number.
@@ -1374,7 +1705,43 @@ class bitfield (base_primitive):
         self.mutant_index += 1
         return True
 
+    def reset (self):
+        self.fuzz_complete       = False
+        self.mutant_index        = 0
+        self.current_field       = ""
+        self.field_mutant_index  = 0
+        self.current_field_index = 0
+        self.sub_mutant_index    = 0
+        self.value               = self.original_value
+        self.dirty               = True
+
+    def restore_state (self, mutant_index):
+        self.mutant_index = mutant_index
+
+        if not mutant_index:
+            return
+
+        # find the field and the position within the field the given mutation belongs to.
+        remaining = mutant_index
+        fields_before = 0
+        for index in xrange(len(self.fields)):
+            count = len(self.fields[index]["mutations"])
+            if remaining <= count: break
+            remaining -= count
+            if count: fields_before += 1
+
+        self.current_field_index = index
+        self.sub_mutant_index    = remaining
+        self.field_mutant_index  = fields_before
+
+        # mutate() steps over a leading field without mutations the same way as over an exhausted one.
+        if not self.fields[0]["mutations"]:
+            self.field_mutant_index += 1
+
     def render (self):
+        if not self.changed():
+            return self.rendered
+
         self.rendered = ""
 
         req_width = (self.length * 8)
@@ -1386,6 +1753,9 @@ class bitfield (base_primitive):
             self.rendered += struct.pack("B", int(r_value[count * 8:(count * 8) + 8], 2))
             count += 1
 
+        self.rendered_value = self.value
+        self.dirty          = False
+
         return self.rendered
 
 # =============================================================================
@@ -1410,6 +1780,8 @@ class padding:
         self.fuzz_complete      = False                      # flag if this primitive has been completely fuzzed
         self.fuzz_library       = []                         # library of static fuzz heuristics to cycle through.
         self.mutant_index       = 0                          # current mutation number
+        self.rendered_block     = None                       # block contents the cached rendering was padded for
+        self.rendered_value     = None                       # value the cached rendering was produced from
 
         if not block_name:
             raise sex.SullyRuntimeError("'%s' primitive requires a block_name" % self.s_type)
@@ -1449,6 +1821,39 @@ class padding:
 
         return True
 
+    def exhaust (self):
+        '''
+        Exhaust the possible mutations for this primitive.
+
+        @rtype:  Integer
+        @return: The number of mutations to reach exhaustion
+        '''
+
+        num = self.num_mutations() - self.mutant_index
+
+        self.fuzz_complete  = True
+        self.mutant_index   = self.num_mutations()
+        self.value          = self.original_value
+
+        return num
+
+    def seek (self, mutant_index):
+        '''
+        Jump to the given mutation, see base_primitive.seek().
+        '''
+
+        self.reset()
+
+        if not self.fuzzable or mutant_index <= 0:
+            return False
+
+        if mutant_index > self.num_mutations():
+            self.exhaust()
+            return False
+
+        self.mutant_index = mutant_index - 1
+        return self.mutate()
+
     def render (self):
         try:
             block = self.request.closed_blocks[self.block_name].rendered
@@ -1457,6 +1862,13 @@ class padding:
         except Exception, ex:
             raise sex.SullyRuntimeError("padding primitive could not process block '%s', exception: %s" % (self.block_name, str(ex)))
 
+        # the padding only has to be calculated again if the contents of the block or the value changed.
+        if block is self.rendered_block and self.value is self.rendered_value:
+            return self.rendered
+
+        self.rendered_block = block
+        self.rendered_value = self.value
+
         block_length = len(block)
         add_bytes = (self.byte_align - (block_length % self.byte_align)) % self.byte_align
         self.rendered = struct.pack("B", self.pad_byte) * add_bytes
@@ -7,20 +7,26 @@ import re
 import sys
 import md5
 import time
+import hashlib
 import json
 import base64
 import socket
+import Queue
+import bisect
 import select
 import threading
+import multiprocessing
 
 import media
 import blocks
 import pgraph
 import sex
+import timing
 import primitives
 
 from agent import agent
 from classes import DatabaseHandler as db
+from classes import StatusWriter as sw
 
 # =======================================================================================
 #
@@ -64,20 +70,268 @@ class connection(pgraph.edge.edge):
 #
 # =======================================================================================
 
+class generator(multiprocessing.Process):
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def __init__(self, session, queue):
+        '''
+        Process walking the session graph the same way session.fuzz() does and
+        rendering the test cases ahead into a bounded queue, so rendering overlaps
+        with the transmission of the previous test cases. The process is forked, it
+        works on its own copy of the session and the requests.
+
+        The messages put on the queue are dictionaries, a "case" message holds the
+        mutant index, the IDs of the edges along the path to the node being fuzzed and
+        the rendered nodes. The last message is either "finished" or "error".
+
+        @type  session:  session
+        @param session:  The session to generate the test cases of
+        @type  queue:    multiprocessing.Queue
+        @param queue:    The bounded queue to put the test cases on
+        '''
+
+        multiprocessing.Process.__init__(self)
+
+        self.session      = session
+        self.queue        = queue
+        self.mutant_index = session.total_mutant_index
+        self.daemon       = True
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def run(self):
+        try:
+            self.generate(self.session.root, [])
+        except Exception, ex:
+            self.queue.put({"command": "error", "data": str(ex)})
+            return
+
+        self.queue.put({"command": "finished"})
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def generate(self, this_node, path):
+        '''
+        Render the test cases of the nodes reachable from this_node.
+
+        @type  this_node: request (node)
+        @param this_node: Current node that is being fuzzed.
+        @type  path:      List
+        @param path:      Edges along the path to the current node.
+        '''
+
+        session = self.session
+
+        for edge in session.edges_from(this_node.id):
+            fuzz_node     = session.nodes[edge.dst]
+            num_mutations = fuzz_node.num_mutations()
+
+            path.append(edge)
+
+            if self.mutant_index < session.skip:
+                if self.mutant_index + num_mutations <= session.skip:
+                    fuzz_node.exhaust()
+                    self.mutant_index += num_mutations
+                else:
+                    fuzz_node.seek(session.skip - self.mutant_index)
+                    self.mutant_index = session.skip
+
+            # the nodes along the path are sent in their default state, they only
+            # have to be rendered once.
+
+            prefix = [session.nodes[e.dst].render() for e in path[:-1]]
+
+            while self.mutant_index < session.range_end and fuzz_node.mutate():
+                self.mutant_index += 1
+
+                if self.mutant_index > session.skip:
+                    self.queue.put({
+                        "command": "case",
+                        "data": {
+                            "mutant_index": self.mutant_index,
+                            "path": [e.id for e in path],
+                            "data": prefix + [fuzz_node.render()]
+                        }
+                    })
+
+            self.generate(fuzz_node, path)
+
+        if path:
+            path.pop()
+
+# =======================================================================================
+#
+# =======================================================================================
+
+class deadline:
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def __init__(self, cap, factor=4.0, percentile=95, minimum=0.01, window=256,
+                 samples=16, tolerance=3):
+        '''
+        Learn how fast the target responds and derive the receive timeout from it. The
+        timeout is a multiple of a percentile of the latencies of the last responses
+        received, kept between the minimum and the timeout configured for the job. Until
+        enough responses were seen, the configured timeout is used.
+
+        A response missing the learned deadline, ie: a valid request slower than the
+        mutated ones rejected right away, is only handled as a failure once tolerance
+        consecutive requests missed it. Each miss doubles the deadline, the backoff
+        wears off again as responses are recorded.
+
+        @type  cap:        Float
+        @param cap:        The timeout configured for the job, the upper limit
+        @type  factor:     Float
+        @param factor:     (Optional, def=4.0) The multiple of the latency to wait for
+        @type  percentile: Integer
+        @param percentile: (Optional, def=95) The percentile of the latencies to use
+        @type  minimum:    Float
+        @param minimum:    (Optional, def=0.01) The lower limit of the timeout
+        @type  window:     Integer
+        @param window:     (Optional, def=256) The number of latencies to keep
+        @type  samples:    Integer
+        @param samples:    (Optional, def=16) The number of latencies needed to adapt
+        @type  tolerance:  Integer
+        @param tolerance:  (Optional, def=3) The number of consecutive misses handled
+                           as a failure
+        '''
+
+        self.cap        = float(cap)
+        self.factor     = float(factor)
+        self.percentile = float(percentile)
+        self.minimum    = min(float(minimum), self.cap)
+        self.window     = int(window)
+        self.samples    = int(samples)
+        self.tolerance  = max(1, int(tolerance))
+        self.latencies  = []
+        self.position   = 0
+        self.responses  = 0
+        self.timeouts   = 0
+        self.misses     = 0
+        self.backoff    = 1.0
+        self.current    = self.cap
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def record(self, latency):
+        '''
+        Record the latency of a response.
+
+        @type  latency: Float
+        @param latency: Seconds between sending the request and receiving the response
+        '''
+
+        if len(self.latencies) < self.window:
+            self.latencies.append(latency)
+        else:
+            self.latencies[self.position] = latency
+            self.position = (self.position + 1) % self.window
+        self.responses += 1
+        self.misses     = 0
+        self.backoff    = max(1.0, self.backoff * 0.95)
+
+        if len(self.latencies) < self.samples: return
+        latency = self.latency(self.percentile)
+        self.current = min(self.cap, max(self.minimum, latency * self.factor * self.backoff))
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def missed(self):
+        '''
+        Record a request which did not get a response in time, the deadline is doubled.
+
+        @rtype:  Boolean
+        @return: True if the miss has to be handled as a failure, either because the
+                 configured timeout was waited for or the tolerated number of
+                 consecutive misses was reached
+        '''
+
+        waited         = self.current
+        self.timeouts += 1
+        self.misses   += 1
+
+        if self.current < self.cap:
+            self.backoff *= 2
+            self.current  = min(self.cap, self.current * 2)
+
+        if waited < self.cap and self.misses < self.tolerance:
+            return False
+
+        self.misses = 0
+        return True
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def latency(self, percentile):
+        if not self.latencies: return None
+        latencies = sorted(self.latencies)
+        index = int(round(percentile / 100.0 * (len(latencies) - 1)))
+        return latencies[index]
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def timeout(self):
+        return self.current
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def stats(self):
+        '''
+        @rtype:  Dictionary
+        @return: The current timeout and the latencies observed, to be stored with the
+                 status of the job
+        '''
+
+        return {
+            "recv_timeout": self.current,
+            "latency_p50":  self.latency(50),
+            "latency_p%d" % self.percentile: self.latency(self.percentile),
+            "responses":    self.responses,
+            "timeouts":     self.timeouts,
+            "backoff":      self.backoff
+        }
+
+# =======================================================================================
+#
+# =======================================================================================
+
 class session(pgraph.graph):
 
     # -----------------------------------------------------------------------------------
     #
     # -----------------------------------------------------------------------------------
 
-    def __init__(self, config, root, session_id, settings, transport, conditions, job):
+    def __init__(self, config, root, session_id, settings, transport, conditions, job, shard=None):
         pgraph.graph.__init__(self)
 
         self.session_id          = session_id
         self.job_data            = job
+        self.seed                = job.get('seed') if job else None
         self.root_dir            = root
         self.config              = config
         self.database            = db.DatabaseHandler(self.config, self.root_dir)
+        self.status_writer       = sw.StatusWriter(self.config, self.database,
+                                                   session_id, shard)
         self.media               = transport['media'].lower()
         self.transport_media     = None
         self.proto               = transport['protocol'].lower()
@@ -90,6 +344,18 @@ class session(pgraph.graph):
         self.bind                = None
         self.restart_interval    = 0
         self.timeout             = 5.0
+        self.workers             = 1
+        self.shard               = shard
+        self.pipeline            = 0
+        self.keep_alive          = False
+        self.reconnect_interval  = 0
+        self.deadline            = None
+        self.batch_size          = 0
+        self.batch_enabled       = None
+        self.batch               = []
+        self.timing              = timing.phases()
+        self.issue_storage       = "copy"
+        self.descriptor          = None
 
         self.pre_send            = None
         self.post_send           = None
@@ -104,9 +370,31 @@ class session(pgraph.graph):
             self.restart_interval = settings['restart_interval']
         if settings.get('timeout') != None: 
             self.timeout = settings['timeout']
+        if settings.get('workers') != None and self.shard != None:
+            self.workers = int(settings['workers'])
+        if settings.get('pipeline') != None:
+            self.pipeline = int(settings['pipeline'])
+        if settings.get('keep_alive') != None:
+            self.keep_alive = bool(settings['keep_alive'])
+        if settings.get('reconnect_interval') != None:
+            self.reconnect_interval = int(settings['reconnect_interval'])
+        if settings.get('batch') != None:
+            self.batch_size = int(settings['batch'])
+        if settings.get('issue_storage') in ["copy", "reference"]:
+            self.issue_storage = settings['issue_storage']
+        if settings.get('adaptive_timeout'):
+            self.deadline = deadline(self.timeout,
+                                     settings.get('timeout_factor', 4.0),
+                                     settings.get('timeout_percentile', 95),
+                                     settings.get('timeout_minimum', 0.01),
+                                     tolerance=settings.get('timeout_tolerance', 3))
 
         self.total_num_mutations = 0
         self.total_mutant_index  = 0
+        self.counts              = None  # paths to the nodes and prefix sums of their mutation counts, see mutation_counts().
+        self.counts_generation   = None
+        self.range_start         = 0
+        self.range_end           = 0
         self.fuzz_node           = None
         self.pause_flag          = False
         self.stop_flag           = False
@@ -116,6 +404,9 @@ class session(pgraph.graph):
         self.warning_count       = 0
         self.previous_sent       = None
         self.current_sent        = None
+        self.missed_sent         = None
+        self.connection_path     = None
+        self.connection_cases    = 0
 
         try:
             self.transport_media = getattr(media, self.media)(self.bind, self.timeout)
@@ -176,13 +467,14 @@ class session(pgraph.graph):
         '''
 
         try:
-            node.number = len(self.nodes)
-            node.id     = len(self.nodes)
+            node.id = len(self.nodes)
 
-            if not self.nodes.has_key(node.id):
-                self.nodes[node.id] = node
+            # the random primitives of the requests derive their mutations from
+            # the seed of the job.
+            if hasattr(node, "set_seed"):
+                node.set_seed(self.seed)
 
-            return self
+            return pgraph.graph.add_node(self, node)
         except Exception, ex:
             self.database.log("error",
                               "failed to add node for job: %s" %\
@@ -279,6 +571,7 @@ class session(pgraph.graph):
 
         edge = connection(src.id, dst.id, callback)
         self.add_edge(edge)
+        self.counts_generation = None
 
         return edge
 
@@ -286,7 +579,14 @@ class session(pgraph.graph):
     #
     # -----------------------------------------------------------------------------------
 
-    def save_status(self):
+    def save_status(self, force=False):
+        '''
+        Report the status of the job. The status is written to the database by the
+        status writer, either on its flush interval or immediately if forced.
+
+        @type  force: Boolean
+        @param force: (Optional, def=False) Write the status immediately
+        '''
 
         status = 0
         if self.finished_flag:
@@ -298,19 +598,20 @@ class session(pgraph.graph):
         else:
             status = 1
 
-        if self.fuzz_node.name:
+        if self.fuzz_node and self.fuzz_node.name:
             current_name = self.fuzz_node.name
         else:
             current_name = ""
 
         try:
-            self.database.updateJob(self.session_id, 
-                                    status,
-                                    current_name,
-                                    self.crash_count,
-                                    self.warning_count,
-                                    self.total_mutant_index,
-                                    self.total_num_mutations)
+            self.status_writer.updateJob(status,
+                                         current_name,
+                                         self.crash_count,
+                                         self.warning_count,
+                                         self.total_mutant_index - self.range_start,
+                                         self.total_num_mutations,
+                                         force,
+                                         self.session_stats)
         except Exception, ex:
             self.database.log("error",
                               "failed to save status for job %s" %\
@@ -321,62 +622,51 @@ class session(pgraph.graph):
     #
     # -----------------------------------------------------------------------------------
 
-    def save_session(self):
+    def session_stats(self):
+        '''
+        @rtype:  Dictionary
+        @return: The statistics stored with the status of the job: the time spent in
+                 each phase of the session and, with an adaptive timeout, the latencies
+                 of the target
+        '''
+
+        stats = {}
+        if self.deadline: stats.update(self.deadline.stats())
+        stats["timing"] = self.timing.stats()
+        return stats
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def save_session(self, force=False):
         '''
-        Dump various object values to database
+        Dump various object values to database, see save_status().
+
+        @type  force: Boolean
+        @param force: (Optional, def=False) Write the session data immediately
         '''
 
-        is_update = False
         try:
-            is_update = self.database.loadSession(self.session_id)
+            self.status_writer.updateSession({
+                "job_id":              self.session_id,
+                "shard":               self.shard,
+                "proto":               self.proto,
+                "skip":                self.skip,
+                "sleep_time":          self.sleep_time,
+                "restart_interval":    self.restart_interval,
+                "timeout":             self.timeout,
+                "crash_count":         self.crash_count,
+                "warning_count":       self.warning_count,
+                "total_num_mutations": self.total_num_mutations,
+                "total_mutant_index":  self.total_mutant_index,
+                "pause_flag":          self.pause_flag
+            }, force)
         except Exception, ex:
             self.database.log("error",
-                              "failed check session data for job %s" %\
+                              "failed to save session data for job %s" %\
                               self.session_id,
                               str(ex))
-            return False
-
-        if is_update:
-            try:
-                self.database.updateSession(self.session_id, {
-                    "$set": {
-                        "skip":                self.skip,
-                        "sleep_time":          self.sleep_time,
-                        "restart_interval":    self.restart_interval,
-                        "timeout":             self.timeout,
-                        "crash_count":         self.crash_count,
-                        "warning_count":       self.warning_count,
-                        "total_num_mutations": self.total_num_mutations,
-                        "total_mutant_index":  self.total_mutant_index,
-                        "pause_flag":          self.pause_flag
-                    }
-                })
-            except Exception, ex:
-                self.database.log("error",
-                                  "failed to update session data for job %s" %\
-                                  self.session_id,
-                                  str(ex))
-
-        else:
-            try:
-                self.database.saveSession({
-                    "job_id":              self.session_id,
-                    "proto":               self.proto,
-                    "skip":                self.skip,
-                    "sleep_time":          self.sleep_time,
-                    "restart_interval":    self.restart_interval,
-                    "timeout":             self.timeout,
-                    "crash_count":         self.crash_count,
-                    "warning_count":       self.warning_count,
-                    "total_num_mutations": self.total_num_mutations,
-                    "total_mutant_index":  self.total_mutant_index,
-                    "pause_flag":          self.pause_flag
-                })
-            except Exception, ex:
-                self.database.log("error",
-                                  "failed to save session data for job %s" %\
-                                  self.session_id,
-                                  str(ex))
 
     # -----------------------------------------------------------------------------------
     #
@@ -389,7 +679,7 @@ class session(pgraph.graph):
 
         session_data = None
         try:
-            session_data = self.database.loadSession(self.session_id)
+            session_data = self.database.loadSession(self.session_id, self.shard)
         except Exception, ex:
             self.database.log("error",
                               "failed to load session data for job %s" %\
@@ -405,8 +695,8 @@ class session(pgraph.graph):
             self.proto               = session_data.get('proto')
             self.restart_interval    = session_data.get('restart_interval')
             self.timeout             = session_data.get('timeout')
-            self.crash_count         = session_data.get('crashes')
-            self.warning_count       = session_data.get('warnings')
+            self.crash_count         = session_data.get('crash_count')
+            self.warning_count       = session_data.get('warning_count')
             self.total_num_mutations = session_data.get('total_num_mutations')
             self.total_mutant_index  = session_data.get('total_mutant_index')
             self.pause_flag          = session_data.get('pause_flag')
@@ -451,6 +741,14 @@ class session(pgraph.graph):
             self.total_mutant_index  = 0
             self.total_num_mutations = self.num_mutations()
 
+            # if the job is split between multiple workers, this session is only 
+            # responsible for a contiguous range of the test cases.
+            self.range_start = self.total_num_mutations * self.shard / self.workers \
+                               if self.shard != None else 0
+            self.range_end   = self.total_num_mutations * (self.shard + 1) / self.workers \
+                               if self.shard != None else self.total_num_mutations
+            self.skip        = max(self.skip, self.range_start)
+
         # If no errors above and not already connected to the agent, initialize the
         # agent connection.
         # If the agent cannot be initialized make sure the user is aware of it.
@@ -468,7 +766,7 @@ class session(pgraph.graph):
 
                 self.finished_flag = True
                 self.stop_flag = True
-                self.save_status()
+                self.save_status(True)
                 return
 
         # Get the agent to execute 
@@ -482,7 +780,7 @@ class session(pgraph.graph):
 
                 self.finished_flag = True
                 self.stop_flag = True
-                self.save_status()
+                self.save_status(True)
                 return
 
             self.database.log("info", 
@@ -490,12 +788,20 @@ class session(pgraph.graph):
                               self.session_id)
             time.sleep(3)
 
+        # if enabled, let a separate process generate the test cases and only transmit
+        # them here.
+
+        if this_node == self.root and self.pipelined():
+            self.fuzz_pipeline()
+            return
+
         # step through every edge from the current node.
 
         for edge in self.edges_from(this_node.id):
 
             if self.stop_flag:
-                self.save_status()
+                self.send_batch()
+                self.save_status(True)
                 return 
 
             # the destination node is the one actually being fuzzed.
@@ -507,6 +813,17 @@ class session(pgraph.graph):
             # one path through a set of given nodes we don't want any ambiguity.
             path.append(edge)
 
+            # when resuming, jump straight to the test case to continue from instead of
+            # stepping through every mutation that has to be skipped.
+
+            if self.total_mutant_index < self.skip:
+                if self.total_mutant_index + num_mutations <= self.skip:
+                    self.fuzz_node.exhaust()
+                    self.total_mutant_index += num_mutations
+                else:
+                    self.fuzz_node.seek(self.skip - self.total_mutant_index)
+                    self.total_mutant_index = self.skip
+
             done_with_fuzz_node = False
 
             # loop through all possible mutations of the fuzz node.
@@ -515,12 +832,22 @@ class session(pgraph.graph):
                 # if we need to pause, do so.
                 self.pause()
 
+                # stop when reached the end of the range of test cases handled by
+                # this session.
+
+                if self.total_mutant_index >= self.range_end:
+                    break
+
                 # If we have exhausted the mutations of the fuzz node, break out of the 
                 # while(1). 
                 # Note: when mutate() returns False, the node has been reverted to the 
                 # default (valid) state.
 
-                if not self.fuzz_node.mutate():
+                started = timing.monotonic()
+                mutated = self.fuzz_node.mutate()
+                self.timing.record("mutate", started)
+
+                if not mutated:
                     if self.config['general']['debug'] > 0:
                         self.database.log("info",
                                           "all possible mutations exhausted for job %s" %\
@@ -555,142 +882,536 @@ class session(pgraph.graph):
                                           (self.session_id, self.fuzz_node.mutant_index, 
                                           num_mutations))
 
-                    # attempt to complete a fuzz transmission. keep trying until we are 
-                    # successful, whenever a failure occurs, restart the target.
+                    self.send_case([(self.nodes[e.dst], e, None) for e in path])
 
-                    while not self.stop_flag:
-                        try:
-                            self.transport_media.connect()
-                        except Exception, ex:
-                            self.handle_crash("fail_connection", 
-                                              "failed to connect to target, possible crash: %s" %\
-                                              str(ex))
+            # recursively fuzz the remainder of the nodes in the session graph.
 
-                        # if the user registered a pre-send function, pass it the sock 
-                        # and let it do the deed.
+            self.fuzz(self.fuzz_node, path)
 
-                        try:
-                            if self.pre_send: self.pre_send(self.transport_media.media_socket())
-                        except Exception, ex:
-                            self.handle_crash("fail_send", 
-                                              "pre_send() failed, possible crash: %s" %\
-                                              str(ex))
-                            continue
+        # finished with the last node on the path, pop it off the path stack.
 
-                        # send out valid requests for each node in the current path up to 
-                        # the node we are fuzzing.
+        if path:
+            path.pop()
 
-                        for e in path[:-1]:
-                            node = self.nodes[e.dst]
-                            if not self.transmit(node, e):
-                                continue
+        self.check_finished()
 
-                        # now send the current node we are fuzzing.
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
 
-                        if not self.transmit(self.fuzz_node, edge):
-                            continue
+    def check_finished(self):
+        '''
+        Finish the job if the session went through its range of test cases.
+        '''
 
-                        # if we reach this point the send was successful for break out 
-                        # of the while(1).
+        self.send_batch()
 
-                        break
+        if self.total_mutant_index >= self.range_end:
+            self.finished_flag = True
+            self.stop_flag = True
+            self.database.log("info", "job %s finished" % self.session_id)
+            if self.agent != None and self.agent_settings != None:
+                self.agent_cleanup()
 
-                    try:
-                        if self.post_send: self.post_send(self.transport_media.media_socket())
-                    except Exception, ex:
-                        self.handle_crash("fail_send", 
-                                          "post_send() failed, possible crash: %s" %\
-                                          str(ex))
-                        continue
+        self.save_status(True)
 
-                    # done with the socket.
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
 
-                    try:
-                        self.transport_media.disconnect()
-                    except Exception, ex:
-                        pass
+    def pipelined(self):
+        '''
+        Determine whether the test cases can be generated by a separate process. Edge
+        callbacks may modify the nodes before they are sent, so pipelining is not
+        possible if any of the edges has a callback.
 
-                    # serialize the current session state to disk.
+        @rtype:  Boolean
+        @return: True if pipelining is enabled and possible, otherwise False
+        '''
 
-                    self.save_status()
-                    self.save_session()
+        if self.pipeline <= 0:
+            return False
 
-                    # delay in between test cases.
+        for edge in self.edges.values():
+            if getattr(edge, "callback", None):
+                self.database.log("warning",
+                                  "pipelining disabled for job %s, the graph has edge callbacks" %\
+                                  self.session_id)
+                return False
 
-                    if self.config['general']['debug'] > 2:
-                        self.database.log("debug",
-                                          "sleeping for %f seconds for job %s" %\
-                                          (self.sleep_time, self.session_id))
-                    time.sleep(self.sleep_time)
+        return True
 
-            # recursively fuzz the remainder of the nodes in the session graph.
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
 
-            self.fuzz(self.fuzz_node, path)
+    def fuzz_pipeline(self):
+        '''
+        Transmit the test cases rendered ahead by a generator process. At most 
+        self.pipeline test cases are rendered ahead, the generator blocks while the
+        queue is full, including while the session is paused.
+        '''
 
-        # finished with the last node on the path, pop it off the path stack.
+        queue = multiprocessing.Queue(self.pipeline)
+        producer = generator(self, queue)
+        producer.start()
 
-        if path:
-            path.pop()
+        while not self.stop_flag:
+            self.pause()
 
-        if self.total_mutant_index == self.total_num_mutations:
-            self.finished_flag = True
-            self.stop_flag = True
-            self.database.log("info", "job %s finished" % self.session_id)
-            if self.agent != None and self.agent_settings != None:
-                self.agent_cleanup()
+            started = timing.monotonic()
+            try:
+                message = queue.get(True, 1)
+                self.timing.record("generate", started)
+            except Queue.Empty:
+                if producer.is_alive(): continue
+                self.database.log("error",
+                                  "test case generator terminated for job %s" %\
+                                  self.session_id)
+                break
+
+            if message["command"] == "error":
+                self.database.log("error",
+                                  "failed to generate test case for job %s" %\
+                                  self.session_id,
+                                  message["data"])
+                break
+
+            if message["command"] == "finished":
+                break
+
+            case = message["data"]
+            path = []
+
+            for (edge_id, data) in zip(case["path"], case["data"]):
+                edge = self.edges[edge_id]
+                path.append((self.nodes[edge.dst], edge, data))
+
+            self.fuzz_node          = path[-1][0]
+            self.total_mutant_index = case["mutant_index"]
+
+            if self.restart_interval and self.total_mutant_index % self.restart_interval == 0:
+                if self.config['general']['debug'] > 0:
+                    self.database.log("warning",
+                                      "restart interval reached for job %s" %\
+                                      self.session_id)
+
+                if self.agent != None and self.agent_settings != None:
+                    self.agent.start()
+
+            if self.config['general']['debug'] > 1:
+                self.database.log("debug",
+                                  "%s: fuzzing %d / %d" %\
+                                  (self.session_id, self.total_mutant_index,
+                                  self.total_num_mutations))
+
+            self.send_case(path)
+
+        if producer.is_alive():
+            producer.terminate()
+        producer.join()
 
+        self.check_finished()
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def send_case(self, path):
+        '''
+        Transmit a test case, or add it to the batch to be sent if batching is enabled.
+        The nodes along the path are sent before the node being fuzzed, which is the
+        last one on the path.
+
+        @type  path:     List
+        @param path:     (node, edge, data) tuples of the nodes to send, data is None
+                         if the node has to be rendered
+        '''
+
+        if not self.batched():
+            self.send_single(path)
+            return
+
+        started = timing.monotonic()
+        try:
+            path = [(node, e, data if data != None else node.render())
+                    for (node, e, data) in path]
+            self.timing.record("render", started)
+        except Exception, ex:
+            self.database.log("error",
+                              "failed to render node for transmit for job %s" %\
+                              self.session_id,
+                              str(ex))
+            return
+
+        self.batch.append((self.total_mutant_index, self.fuzz_node, path))
+        if len(self.batch) >= self.batch_size:
+            self.send_batch()
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def batched(self):
+        '''
+        Determine whether the test cases are sent in batches. Batching requires a media
+        supporting it, such as the network media using UDP, and is not possible if the
+        nodes or the socket are handled by callbacks between the transmissions.
+
+        @rtype:  Boolean
+        @return: True if batching is enabled and possible, otherwise False
+        '''
+
+        if self.batch_enabled != None:
+            return self.batch_enabled
+
+        self.batch_enabled = False
+        if self.batch_size <= 1:
+            return False
+
+        if not self.transport_media.media_batch():
+            self.database.log("warning",
+                              "batching disabled for job %s, not supported by the media" %\
+                              self.session_id)
+        elif self.pre_send or self.post_send or \
+             [e for e in self.edges.values() if getattr(e, "callback", None)]:
+            self.database.log("warning",
+                              "batching disabled for job %s, the session has callbacks" %\
+                              self.session_id)
+        else:
+            self.batch_enabled = True
+
+        return self.batch_enabled
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def send_batch(self):
+        '''
+        Send the batched test cases at once. The responses carry nothing telling which
+        node they answer, so a response is expected to every node sent. A target which
+        stopped responding answered the nodes sent before the one responsible, so the
+        test cases covered by the number of responses received are recorded as sent,
+        in order, the same way as when sent one by one. If missing responses are to be
+        handled, the test cases from the first one short of responses are sent again
+        one by one to find the one responsible.
+        '''
+
+        cases      = self.batch
+        self.batch = []
+        if not cases: return
+
+        messages = []
+        for (index, fuzz_node, path) in cases:
+            messages += [data for (node, e, data) in path]
+
+        started = timing.monotonic()
+        try:
+            responses = self.transport_media.send_batch(messages)
+            self.timing.record("batch", started)
+        except Exception, ex:
+            self.database.log("warning",
+                              "failed to send batch for job %s, sending test cases one by one" %\
+                              self.session_id,
+                              str(ex))
+            responses = None
+
+        answered = len(responses) if responses != None else 0
+        if responses != None and \
+           not [a for a in self.conditions.get("fail_receive", []) if a != "pass"]:
+            answered = len(messages)
+
+        pending = []
+        for (index, fuzz_node, path) in cases:
+            if pending or answered < len(path):
+                pending.append((index, fuzz_node, path))
+                continue
+
+            answered               -= len(path)
+            self.total_mutant_index = index
+            self.fuzz_node          = fuzz_node
+            for (node, e, data) in path:
+                self.internal_callback(data, e)
+
+        if not pending:
+            self.last_recv = responses[-1] if responses else ""
+            started = timing.monotonic()
+            self.save_status()
+            self.save_session()
+            self.timing.record("status", started)
+            self.sleep()
+            return
+
+        self.database.log("warning",
+                          "%d of %d test cases of a batch missed responses for job %s, sending them one by one" %\
+                          (len(pending), len(cases), self.session_id))
+
+        for (index, fuzz_node, path) in pending:
+            if self.stop_flag: break
+            self.total_mutant_index = index
+            self.fuzz_node          = fuzz_node
+            self.send_single(path)
+
+        (index, fuzz_node, path) = cases[-1]
+        self.total_mutant_index  = index
+        self.fuzz_node           = fuzz_node
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def send_single(self, path):
+        '''
+        Transmit a test case on its own, see send_case().
+        '''
+
+        (fuzz_node, edge, fuzz_data) = path[-1]
+        prefix = [e.id for (node, e, data) in path[:-1]]
+
+        # attempt to complete a fuzz transmission. keep trying until we are 
+        # successful, whenever a failure occurs, restart the target.
+
+        self.transport_media.media_case(self.total_mutant_index)
+
+        while not self.stop_flag:
+            # with a persistent connection the requests leading to the node being
+            # fuzzed were sent when the connection was set up.
+
+            if self.connection_path != None and \
+               (not self.keep_alive or self.connection_path != prefix or \
+                not self.transport_media.media_reusable()):
+                self.media_disconnect()
+
+            if self.connection_path == None:
+                started = timing.monotonic()
+                try:
+                    self.transport_media.connect()
+                    self.timing.record("connect", started)
+                except Exception, ex:
+                    self.handle_crash("fail_connection", 
+                                      "failed to connect to target, possible crash: %s" %\
+                                      str(ex))
+                    self.media_disconnect()
+                    continue
+
+                # if the user registered a pre-send function, pass it the sock 
+                # and let it do the deed.
+
+                started = timing.monotonic()
+                try:
+                    if self.pre_send:
+                        self.pre_send(self.transport_media.media_socket())
+                        self.timing.record("callbacks", started)
+                except Exception, ex:
+                    self.handle_crash("fail_send", 
+                                      "pre_send() failed, possible crash: %s" %\
+                                      str(ex))
+                    self.media_disconnect()
+                    continue
+
+                # send out valid requests for each node in the current path up to 
+                # the node we are fuzzing. the connection is only reused once all of
+                # them were sent.
+
+                prefix_sent = True
+                for (node, e, data) in path[:-1]:
+                    if not self.transmit(node, e, data):
+                        prefix_sent = False
+                        break
+
+                if not prefix_sent:
+                    self.media_disconnect()
+                    continue
+
+                self.connection_path  = prefix
+                self.connection_cases = 0
+
+            # now send the current node we are fuzzing.
+
+            if not self.transmit(fuzz_node, edge, fuzz_data):
+                self.media_disconnect()
+                continue
+
+            # if we reach this point the send was successful for break out 
+            # of the while(1).
+
+            break
+
+        started = timing.monotonic()
+        try:
+            if self.post_send:
+                self.post_send(self.transport_media.media_socket())
+                self.timing.record("callbacks", started)
+        except Exception, ex:
+            self.handle_crash("fail_send", 
+                              "post_send() failed, possible crash: %s" %\
+                              str(ex))
+            return
+
+        # done with the socket, unless it is kept for the next test case. The 
+        # connection is not reused if the target did not respond, or once it was
+        # used for the configured number of test cases.
+
+        self.connection_cases += 1
+        if not self.keep_alive or not self.last_recv or \
+           (self.reconnect_interval and \
+            self.connection_cases >= self.reconnect_interval):
+            self.media_disconnect()
+
+        # serialize the current session state to disk.
+
+        started = timing.monotonic()
         self.save_status()
+        self.save_session()
+        self.timing.record("status", started)
+
+        self.sleep()
 
     # -----------------------------------------------------------------------------------
     #
     # -----------------------------------------------------------------------------------
 
-    def num_mutations(self, this_node=None, path=[]):
+    def sleep(self):
+        '''
+        Delay in between test cases.
         '''
-        Number of total mutations in the graph. The logic of this routine is identical to 
-        that of fuzz(). See fuzz() for inline comments. The member varialbe
-        self.total_num_mutations is updated appropriately by this routine.
 
-        @type  this_node: request (node)
-        @param this_node: (Optional, def=None) Current node that is being fuzzed.
-        @type  path:      List
-        @param path:      (Optional, def=[]) Nodes along the path to the current one 
+        if self.config['general']['debug'] > 2:
+            self.database.log("debug",
+                              "sleeping for %f seconds for job %s" %\
+                              (self.sleep_time, self.session_id))
+        if not self.sleep_time: return
+        started = timing.monotonic()
+        time.sleep(self.sleep_time)
+        self.timing.record("sleep", started)
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def media_disconnect(self):
+        '''
+        Close the connection to the target, the next test case will open a new one.
+        '''
+
+        self.connection_path = None
+        try:
+            self.transport_media.disconnect()
+        except Exception, ex:
+            pass
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def num_mutations(self):
+        '''
+        Number of total mutations in the graph, see mutation_counts(). The member
+        variable self.total_num_mutations is updated appropriately by this routine.
 
         @rtype:  Integer
         @return: Total number of mutations in this session.
         '''
 
-        if not this_node:
-            this_node                = self.root
-            self.total_num_mutations = 0
+        ends = self.mutation_counts()[1]
+        self.total_num_mutations = ends[-1] if ends else 0
+        return self.total_num_mutations
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def mutation_counts(self):
+        '''
+        Return the paths to the nodes of the graph in the order fuzz() goes through them
+        along with the prefix sums of their mutation counts. The table is calculated once
+        and kept until an edge is added or the mutation counts of the requests are
+        invalidated, see blocks.stack_counts().
+
+        @rtype:  Tuple
+        @return: The list of the edges along the path to each node and the list of the
+                 total number of mutations up to and including each node
+        '''
+
+        if self.counts_generation != primitives.COUNTS_GENERATION:
+            paths = []
+            ends  = []
+            total = 0
+
+            for path in self.walk_paths(self.root, []):
+                total += self.nodes[path[-1].dst].num_mutations()
+                paths.append(path)
+                ends.append(total)
+
+            self.counts            = (paths, ends)
+            self.counts_generation = primitives.COUNTS_GENERATION
+
+        return self.counts
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
+    def walk_paths(self, this_node, path):
+        '''
+        Enumerate the paths to the nodes reachable from this_node, in the order fuzz()
+        goes through them.
+
+        @type  this_node: request (node)
+        @param this_node: Node to enumerate the paths from
+        @type  path:      List
+        @param path:      Edges along the path to this_node
 
+        @rtype:  List
+        @return: The lists of the edges along the path to each node
+        '''
+
+        paths = []
         for edge in self.edges_from(this_node.id):
-            next_node                 = self.nodes[edge.dst]
-            self.total_num_mutations += next_node.num_mutations()
+            paths.append(path + [edge])
+            paths += self.walk_paths(self.nodes[edge.dst], path + [edge])
+        return paths
 
-            if edge.src != self.root.id:
-                path.append(edge)
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
 
-            self.num_mutations(next_node, path)
+    def locate(self, mutant_index):
+        '''
+        Find the node fuzzed by a test case, see mutation_counts().
 
-        # finished with the last node on the path, pop it off the path stack.
-        if path:
-            path.pop()
+        @type  mutant_index: Integer
+        @param mutant_index: The mutant index of the test case within the session
 
-        return self.total_num_mutations
+        @rtype:  Tuple
+        @return: The edges along the path to the node fuzzed by the test case and the
+                 mutant index of the test case within the node. If not found, None and
+                 the number of test cases past the last one of the session.
+        '''
+
+        (paths, ends) = self.mutation_counts()
+        position      = bisect.bisect_left(ends, mutant_index)
+
+        if position == len(ends):
+            return (None, mutant_index - (ends[-1] if ends else 0))
+
+        return (paths[position], mutant_index - (ends[position - 1] if position else 0))
 
     # -----------------------------------------------------------------------------------
     #
     # -----------------------------------------------------------------------------------
 
-    def transmit(self, node, edge):
+    def transmit(self, node, edge, data=None):
         '''
         Render and transmit a node, process callbacks accordingly.
 
-        @type  node:   Request (Node)
-        @param node:   Request/Node to transmit
-        @type  edge:   Connection (pgraph.edge)
-        @param edge:   Edge along the current fuzz path from "node" to next node.
+        @type  node: Request (Node)
+        @param node: Request/Node to transmit
+        @type  edge: Connection (pgraph.edge)
+        @param edge: Edge along the current fuzz path from "node" to next node.
+        @type  data: String
+        @param data: (Optional, def=None) The node rendered ahead, see fuzz_pipeline()
         '''
 
         if self.config['general']['debug'] > 1:
@@ -698,11 +1419,12 @@ class session(pgraph.graph):
                               "transmitting [%d.%d] for job %s" %\
                               (node.id, self.total_mutant_index, self.session_id))
 
-        data = None
-
-        # if no data was returned by the callback, render the node here.
+        # if the node was not rendered ahead, render it here.
         try:
-            data = node.render()
+            if data == None:
+                started = timing.monotonic()
+                data = node.render()
+                self.timing.record("render", started)
         except Exception, ex:
             self.database.log("error",
                               "failed to render node for transmit for job %s" %\
@@ -714,9 +1436,11 @@ class session(pgraph.graph):
         # the node, modify it and return.
 
         if edge.callback:
+            started = timing.monotonic()
             try:
                 data = edge.callback(self, node, edge,
                                      self.transport_media.media_socket())
+                self.timing.record("callbacks", started)
             except Exception, ex:
                 self.database.log("error",
                                   "failed to execute callback for job %s" %\
@@ -724,10 +1448,16 @@ class session(pgraph.graph):
                                   str(ex))
                 return False
 
-        self.internal_callback(data)
+        self.internal_callback(data, edge)
+
+        if self.deadline:
+            waited = self.deadline.timeout()
+            self.transport_media.media_timeout(waited)
+        sent = timing.monotonic()
 
         try:
             self.transport_media.send(data)
+            self.timing.record("send", sent)
             if self.config['general']['debug'] > 5:
                 self.database.log("debug",
                                   "job %s sent packet: %s" %\
@@ -738,11 +1468,24 @@ class session(pgraph.graph):
                               "failed to send on socket, possible crash")
             return False
 
-        # TODO: check to make sure the receive timeout is not too long...
+        reason  = ""
+        expired = False
+        started = timing.monotonic()
         try:
             self.last_recv = self.transport_media.recv(10000)
+        except socket.timeout, ex:
+            self.last_recv = ""
+            reason = str(ex)
+            expired = True
         except Exception, ex:
             self.last_recv = ""
+            reason = str(ex)
+        self.timing.record("recv", started)
+
+        # the time it took to respond is used to adjust the timeout of the next requests.
+        if self.deadline and self.last_recv:
+            self.deadline.record(timing.monotonic() - sent)
+            self.missed_sent = None
 
         if len(self.last_recv) > 0:
             if self.config['general']['debug'] > 1:
@@ -750,27 +1493,38 @@ class session(pgraph.graph):
                                   "job %s received: [%d] %s" %\
                                   (self.session_id, len(self.last_recv),
                                   repr(self.last_recv)))
+
+        # with an adaptive timeout, a few consecutive requests may miss the learned
+        # deadline before the failure is handled. the first of them is the one the
+        # target stopped responding to.
+
+        elif self.deadline and expired and not self.deadline.missed():
+            if self.missed_sent == None:
+                self.missed_sent = self.current_sent
+            if self.config['general']['debug'] > 1:
+                self.database.log("debug",
+                                  "job %s missed the receive deadline of %f seconds" %\
+                                  (self.session_id, waited))
         else:
             self.handle_crash("fail_receive",
-                              "nothing received on socket, possible crash")
+                              "nothing received on socket, possible crash %s" %\
+                              reason)
+            self.missed_sent = None
 
+        started = timing.monotonic()
         self.save_status()
+        self.timing.record("status", started)
         return True
 
     # -----------------------------------------------------------------------------------
     #
     # -----------------------------------------------------------------------------------
 
-    def internal_callback(self, data = None):
-        node_data = ""
-        if data:
-            try:
-                node_data = base64.b64encode(str(data))
-            except Exception, ex:
-                self.database.log("error",
-                                  "job %s failed to render node data when saving status" %\
-                                  self.session_id, 
-                                  str(ex))
+    def internal_callback(self, data = None, edge = None):
+        # the data is only encoded when saved with an issue, see dump_crash_data().
+        # the node sent is either the node fuzzed or one of the nodes leading to it,
+        # the edge to it tells which.
+        node_data = data or ""
 
         try:
             self.previous_sent = self.current_sent
@@ -779,6 +1533,7 @@ class session(pgraph.graph):
                 "time": time.time(),
                 "name": str(self.fuzz_node.name),
                 "mutant_index": self.total_mutant_index,
+                "edge": edge.id if edge else None,
                 "process_status": {},
                 "request": node_data
             }
@@ -803,10 +1558,51 @@ class session(pgraph.graph):
         if process_status == None:
             process_status = {}
 
+        # the record of the test case sent may be dumped again, ie: as the previous
+        # test case after a retry, it is left as it is.
+        crash_data = dict(crash_data)
+
         crash_data["process"] = process_status
         crash_data["crash"]   = crash
         crash_data["warning"] = warning
-        crash_data["job"]     = self.job_data
+        crash_data["storage"] = self.issue_storage
+
+        try:
+            node_data = str(crash_data.get("request") or "")
+            crash_data["sha1"] = hashlib.sha1(node_data).hexdigest()
+        except Exception, ex:
+            self.database.log("error",
+                              "job %s failed to render node data when saving issue" %\
+                              self.session_id,
+                              str(ex))
+            node_data = ""
+
+        # the path to the node fuzzed and the position on it of the node sent, the
+        # nodes before the node fuzzed are sent unmutated.
+
+        path  = self.locate(crash_data.get("mutant_index"))[0] or []
+        edges = [e.id for e in path]
+
+        crash_data["path"] = [self.nodes[e.dst].name for e in path]
+        crash_data["sent"] = len(path) - 1
+        if crash_data.get("edge") in edges:
+            crash_data["sent"] = edges.index(crash_data["edge"])
+
+        # by reference, only what is needed to render the test case again is saved with
+        # the issue, see IssueReplay. otherwise a copy of the test case and of the job
+        # are saved with every issue.
+
+        if self.issue_storage == "reference":
+            crash_data["request"]    = None
+            crash_data["descriptor"] = self.descriptor_hash()
+        else:
+            crash_data["request"]    = base64.b64encode(node_data)
+            crash_data["job"]        = self.job_data
+
+        # the seed of the job and the mutant index reproduce the test case: the random
+        # primitives derive their values from the seed, see request.set_seed(), and the
+        # requests are positioned at the test case with seek().
+        crash_data["seed"] = self.seed
 
         if not self.database.saveIssue(crash_data):
             self.database.log("error",
@@ -817,6 +1613,34 @@ class session(pgraph.graph):
     #
     # -----------------------------------------------------------------------------------
 
+    def descriptor_hash(self):
+        '''
+        Hash of the descriptor of the job, saved with the issues stored by reference so a
+        test case is not rendered again from a descriptor changed since.
+
+        @rtype:  String
+        @return: The MD5 hash of the descriptor file, None if it cannot be read
+        '''
+
+        if self.descriptor != None:
+            return self.descriptor
+
+        try:
+            request_file = self.job_data['request']['request_file']
+            self.descriptor = md5.new(open(self.root_dir + "/requests/" +
+                                           request_file + ".py").read()).hexdigest()
+        except Exception, ex:
+            self.database.log("error",
+                              "failed to hash the descriptor of job %s" %\
+                              self.session_id,
+                              str(ex))
+
+        return self.descriptor
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
     def handle_crash(self, event, message):
         """
         Handle a potential crash situation according to the configuration and the
@@ -850,9 +1674,11 @@ class session(pgraph.graph):
         @param message:  The string description of the event
         """
 
+        started = timing.monotonic()
         for action in self.conditions[event]:
             if action == "pass": continue
             if action == "handle": self.handle_event_action_default(event, message)
+        self.timing.record("crash", started)
 
     # -----------------------------------------------------------------------------------
     #
@@ -870,9 +1696,8 @@ class session(pgraph.graph):
         # status.
 
         if self.agent != None and self.agent_settings != None:
-            if self.agent.check_alive():
-                p_status = self.agent.status()
-            else:
+            p_status = self.agent.status()
+            if p_status == None:
                 self.database.log("error",
                               "job %s could not contact agent, maybe be false positive" %\
                               self.session_id)
@@ -883,6 +1708,12 @@ class session(pgraph.graph):
                               "target process is still running for job %s" %\
                               self.session_id)
 
+        # Medias running the target themselves know how it terminated.
+
+        elif self.transport_media.media_status() != None:
+            p_status = self.transport_media.media_status()
+            process_running = p_status == "OK"
+
         self.database.log("error",
                           "job %s: %s" %\
                           (self.session_id, str(message)))
@@ -923,7 +1754,8 @@ class session(pgraph.graph):
             else:
                 self.crash_count = self.crash_count + 1
                 crash = True
-            self.dump_crash_data(self.current_sent, p_status, warning, crash)
+            self.dump_crash_data(self.missed_sent or self.current_sent, p_status,
+                                 warning, crash)
 
         # If we can't send the request, similarly to fail_connection, it
         # was one of the previous requests to cause the issue.
@@ -941,10 +1773,13 @@ class session(pgraph.graph):
         # In any of the above cases we pause the job or continue if we have an agent
         # and could restart the process.
 
-        self.save_status()
-        self.save_session()
+        self.save_status(True)
+        self.save_session(True)
         if self.agent != None and self.agent_settings != None:
             while not self.restart_process(): pass
+        elif self.transport_media.media_status() != None:
+            # the media starts the target again for the next test case.
+            pass
         else:
             self.set_pause()
             self.pause()
@@ -955,7 +1790,7 @@ class session(pgraph.graph):
 
     def set_pause(self):
         self.pause_flag = 1
-        self.save_status()
+        self.save_status(True)
 
     # -----------------------------------------------------------------------------------
     #
@@ -963,7 +1798,7 @@ class session(pgraph.graph):
 
     def set_resume(self):
         self.pause_flag = 0
-        self.save_status()
+        self.save_status(True)
 
     # -----------------------------------------------------------------------------------
     #
@@ -986,7 +1821,7 @@ class session(pgraph.graph):
 
     def terminate(self):
         self.stop_flag = True
-        self.save_status()
+        self.save_status(True)
 
     # -----------------------------------------------------------------------------------
     #
@@ -1016,6 +1851,22 @@ class session(pgraph.graph):
     #
     # -----------------------------------------------------------------------------------
 
+    def media_cleanup(self):
+        # Once the session stopped sending test cases, let the transport media
+        # release what it kept between test cases.
+
+        try:
+            self.transport_media.media_close()
+        except Exception, ex:
+            self.database.log("error",
+                              "failed to clean up transport media for job %s" %\
+                              self.session_id,
+                              str(ex))
+
+    # -----------------------------------------------------------------------------------
+    #
+    # -----------------------------------------------------------------------------------
+
     def agent_cleanup(self):
         # If we have an agent, try to clean that up properly.
 
@@ -0,0 +1,124 @@
+# =============================================================================
+# Per-phase timing of the fuzzing session
+# =============================================================================
+
+import time
+import ctypes
+import ctypes.util
+
+# -----------------------------------------------------------------------------
+# Python 2 has no monotonic clock, clock_gettime(2) is called through ctypes.
+# Where it is not available the wall clock is used.
+# -----------------------------------------------------------------------------
+
+CLOCK_MONOTONIC = 1
+
+class timespec(ctypes.Structure):
+    _fields_ = [("tv_sec",  ctypes.c_long),
+                ("tv_nsec", ctypes.c_long)]
+
+CLOCK = "wall"
+try:
+    LIBC = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    LIBC.clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    TIMESPEC = timespec()
+    TIMESPEC_REF = ctypes.byref(TIMESPEC)
+    if LIBC.clock_gettime(CLOCK_MONOTONIC, TIMESPEC_REF) == 0:
+        CLOCK = "monotonic"
+except Exception, ex:
+    pass
+
+def monotonic():
+    '''
+    @rtype:  Float
+    @return: The number of seconds elapsed since an arbitrary point in time,
+             not affected by changes of the system time
+    '''
+
+    if CLOCK != "monotonic": return time.time()
+    LIBC.clock_gettime(CLOCK_MONOTONIC, TIMESPEC_REF)
+    return TIMESPEC.tv_sec + TIMESPEC.tv_nsec * 1e-9
+
+# -----------------------------------------------------------------------------
+# The durations of each phase are counted in a histogram of power of two
+# buckets of microseconds: bucket 0 counts durations below 1us, bucket n the
+# ones between 2^(n-1) and 2^n us. The last bucket counts everything longer.
+# -----------------------------------------------------------------------------
+
+BUCKETS = 32
+
+# =============================================================================
+#
+# =============================================================================
+
+class phases:
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def __init__(self):
+        '''
+        Keep count of the time spent in each phase of the fuzzing session. The
+        counters are only kept in memory, stats() returns them in the form
+        stored with the status of the job.
+        '''
+
+        self.started  = monotonic()
+        self.counters = {}
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def record(self, phase, started):
+        '''
+        Record the duration of a phase.
+
+        @type  phase:   String
+        @param phase:   The name of the phase
+        @type  started: Float
+        @param started: The time the phase started at, as returned by
+                        monotonic()
+        '''
+
+        elapsed = monotonic() - started
+        counter = self.counters.get(phase)
+        if counter == None:
+            counter = self.counters[phase] = [0, 0.0, elapsed, elapsed,
+                                              [0] * BUCKETS]
+        counter[0] += 1
+        counter[1] += elapsed
+        if elapsed < counter[2]: counter[2] = elapsed
+        if elapsed > counter[3]: counter[3] = elapsed
+        counter[4][min(int(elapsed * 1000000).bit_length(), BUCKETS - 1)] += 1
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
+    def stats(self):
+        '''
+        @rtype:  Dictionary
+        @return: The number of times each phase was entered, the total, minimum
+                 and maximum time spent in it and the histogram of its
+                 durations, with the trailing empty buckets removed
+        '''
+
+        result = {}
+        for (phase, counter) in self.counters.items():
+            histogram = list(counter[4])
+            while histogram and histogram[-1] == 0: histogram.pop()
+            result[phase] = {
+                "count":     counter[0],
+                "total":     counter[1],
+                "min":       counter[2],
+                "max":       counter[3],
+                "histogram": histogram
+            }
+
+        return {
+            "clock":   CLOCK,
+            "elapsed": monotonic() - self.started,
+            "phases":  result
+        }
@@ -12,6 +12,7 @@ from flask import Flask, make_response
 from pydispatch import dispatcher
 from classes import Event as ev
 from classes import DatabaseHandler as db
+from classes import IssueReplay as ir
 
 __version__ = "2.1.0"
 
@@ -213,6 +214,31 @@ class webserver(threading.Thread):
     #
     # -------------------------------------------------------------------------
 
+    @app.route("/jobs/<id>/timing", methods=['GET'])
+    @apiheaders
+    @validate
+    def r_jobs_timing(id):
+        global database
+        timing = None
+        try:
+            timing = database.loadJobTiming(id)
+        except Exception, ex:
+            database.log("error",
+                         "webserver failed to retrieve timing of job %s" % id,
+                         str(ex))
+            r = Response("error", "timing").get()
+            return r
+
+        if timing == None:
+            r = Response("error", "no timing available").get()
+            return r
+        r = Response("success", "timing", timing).get()
+        return r
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
     @app.route("/jobs/<id>/stop", methods=['GET'])
     @apiheaders
     @validate
@@ -348,6 +374,29 @@ class webserver(threading.Thread):
     #
     # -------------------------------------------------------------------------
 
+    @app.route("/issues/<id>/payload", methods=['GET'])
+    @apiheaders
+    @validate
+    def r_get_issue_payload(id):
+        global database
+        global fuzzlabs_root
+        payload = None
+        try:
+            replay = ir.IssueReplay(fuzzlabs_root, database.config, database)
+            payload = replay.payload(id)
+        except Exception, ex:
+            database.log("error",
+                         "webserver failed to retrieve payload of issue %s" % id,
+                         str(ex))
+            r = Response("error", str(ex)).get()
+            return r
+        r = Response("success", "payload", payload).get()
+        return r
+
+    # -------------------------------------------------------------------------
+    #
+    # -------------------------------------------------------------------------
+
     @app.route("/issues/<id>/delete", methods=['GET'])
     @apiheaders
     @validate
@@ -20,8 +20,6 @@ if s_block_start("TEST_BLOCK"):
     s_word(0x00, format="binary", synchsafe=False, signed=True, full_range=False, fuzzable=True, name="WORD_TEST_1")
     s_dword(0x00, format="binary", synchsafe=True, signed=True, full_range=False, fuzzable=True, name="DWORD_TEST_1")
     s_qword(0x00, format="binary", synchsafe=True, signed=True, full_range=False, fuzzable=True, name="QWORD_TEST_1")
-    # HAVING A SMALL SIZE (e.g. 10) FOR S_STRING BELOW RESULTS IN INCOMPLETE STATUS AND 
-    # JOB SHOWS UP AS NEVER FINISHING.
     s_string("STRING_TEST_1", size=50, padding="\xFE", encoding="ascii", compression="zlib", fuzzable=True, max_len=20, name="STRING_TEST_1")
     s_string("END")
 s_block_end("TEST_BLOCK")
@@ -40,6 +40,16 @@ Feature: database handling
        When we update a job in the database
        Then true is returned if job was updated
 
+  Scenario: update a job executed by multiple workers in the database
+      Given we are connected to the database
+       When we update the job status reported by each worker
+       Then the merged job status is returned
+
+  Scenario: load the phase timing of a job executed by multiple workers
+      Given we are connected to the database
+       When we update the phase timing reported by each worker
+       Then the merged phase timing is returned
+
   Scenario: delete a job in the database
       Given we are connected to the database
        When we delete a job in the database
@@ -55,6 +65,11 @@ Feature: database handling
        When we load the issue from the database
        Then the issue dictionary is returned
 
+  Scenario: load the payload of an issue saved with a copy of it
+      Given we are connected to the database
+       When we load the payload of the issue
+       Then the payload saved with the issue is returned
+
   Scenario: load the list of issues from the database
       Given we are connected to the database
        When we load the list of issues from the database
@@ -0,0 +1,15 @@
+Feature: fuzzing session
+
+  Scenario: give up on a silent target after the learned deadline
+      Given we have a session with an adaptive timeout of 5 seconds
+        And the target responded in 10 milliseconds so far
+       When we send 1 request to a silent target
+       Then waiting for the response took less than 1 second
+        And the missed response is not handled as a failure
+
+  Scenario: handle consecutive missed responses as a failure
+      Given we have a session with an adaptive timeout of 5 seconds
+        And the target responded in 10 milliseconds so far
+       When we send 3 requests to a silent target
+       Then waiting for the response took less than 2 seconds
+        And the missed responses are handled as a failure once
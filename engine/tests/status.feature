@@ -0,0 +1,21 @@
+Feature: job status persistence
+
+  Scenario: hold back job status updates
+      Given we have a status writer flushing every 3 updates
+       When we report 2 job status updates
+       Then the job status is not written to the database
+
+  Scenario: write job status updates on the flush count
+      Given we have a status writer flushing every 3 updates
+       When we report 3 job status updates
+       Then the last job status is written to the database
+
+  Scenario: write job status updates when forced
+      Given we have a status writer flushing every 3 updates
+       When we report a job status update forcing the write
+       Then the last job status is written to the database
+
+  Scenario: store session statistics with the job status
+      Given we have a status writer flushing every 3 updates
+       When we report a job status update with statistics
+       Then the statistics are written to the database
@@ -13,6 +13,7 @@ ROOT_DIR = os.path.dirname(
 sys.path.append(ROOT_DIR + "/../../")
 from ConfigurationHandler import ConfigurationHandler
 from classes.DatabaseHandler import DatabaseHandler
+from classes.IssueReplay import IssueReplay
 
 CONFIG_FILE = ROOT_DIR + "/../../etc/engine.config"
 CONFIG      = ConfigurationHandler(CONFIG_FILE).get()
@@ -29,7 +30,8 @@ ISSUE_DATA = {
     "target": {},
     "name": "TEST",
     "process_status": {},
-    "request": "REQUEST DATA"
+    "request": "REQUEST DATA",
+    "seed": "0123456789abcdef"
 }
 ISSUE_DATA_ID = "10708a964e6a54434d9853a2b1cff7bc0b564d51"
 
@@ -117,6 +119,42 @@ def step_impl(context):
 def step_impl(context):
     assert context.ret_val == True
 
+@when('we update the job status reported by each worker')
+def step_impl(context):
+    DATABASE.updateJob(JOB_DATA["job_id"], 1, "TEST", 1, 0, 10, 100, 0)
+    DATABASE.updateJob(JOB_DATA["job_id"], 3, "TEST", 2, 1, 20, 100, 1)
+    context.ret_val = DATABASE.loadJob(JOB_DATA["job_id"])
+
+@then('the merged job status is returned')
+def step_impl(context):
+    assert context.ret_val["status"] == 1
+    assert context.ret_val["crashes"] == 3
+    assert context.ret_val["warnings"] == 1
+    assert context.ret_val["c_m_index"] == 30
+    assert context.ret_val["t_m_index"] == 100
+
+@when('we update the phase timing reported by each worker')
+def step_impl(context):
+    for shard in range(2):
+        timing = {
+            "clock": "monotonic",
+            "elapsed": 1.0 + shard,
+            "phases": {
+                "send": {"count": 10, "total": 0.5, "min": 0.01 * (shard + 1),
+                         "max": 0.1, "histogram": [0, 2, 8][:shard + 2]}
+            }
+        }
+        DATABASE.updateJob(JOB_DATA["job_id"], 1, "TEST", 0, 0, 10, 100,
+                           shard, {"timing": timing})
+    context.ret_val = DATABASE.loadJobTiming(JOB_DATA["job_id"])
+
+@then('the merged phase timing is returned')
+def step_impl(context):
+    assert context.ret_val["elapsed"] == 2.0
+    assert context.ret_val["phases"]["send"]["count"] == 20
+    assert context.ret_val["phases"]["send"]["min"] == 0.01
+    assert context.ret_val["phases"]["send"]["histogram"] == [0, 4, 8]
+
 @when('we delete a job in the database')
 def step_impl(context):
     context.ret_val = DATABASE.deleteJob(JOB_DATA["job_id"])
@@ -144,6 +182,18 @@ def step_impl(context):
 def step_impl(context):
     assert type(context.ret_val) == dict
     context.ret_val["job_id"] == ISSUE_DATA["job_id"]
+    assert context.ret_val["seed"] == ISSUE_DATA["seed"]
+    assert context.ret_val["mutant_index"] == ISSUE_DATA["mutant_index"]
+
+@when('we load the payload of the issue')
+def step_impl(context):
+    global ISSUE_DATA_ID
+    replay = IssueReplay(ROOT_DIR + "/../../", CONFIG, DATABASE)
+    context.ret_val = replay.payload(ISSUE_DATA_ID)
+
+@then('the payload saved with the issue is returned')
+def step_impl(context):
+    assert context.ret_val == ISSUE_DATA["request"]
 
 @when('we load the list of issues from the database')
 def step_impl(context):
@@ -0,0 +1,83 @@
+from behave import *
+import os
+import sys
+import time
+import socket
+import inspect
+
+ROOT_DIR = os.path.dirname(
+                os.path.abspath(
+                    inspect.getfile(inspect.currentframe()
+                )))
+
+sys.path.append(ROOT_DIR + "/../../")
+sys.path.append(ROOT_DIR + "/../../modules/jobshandler")
+from ConfigurationHandler import ConfigurationHandler
+from sulley import *
+
+CONFIG_FILE = ROOT_DIR + "/../../etc/engine.config"
+CONFIG      = ConfigurationHandler(CONFIG_FILE).get()
+
+SESSION_JOB_ID = "cccccccccccccccccccccccccccccccc"
+
+if not blocks.REQUESTS.has_key("SESSION_TEST"):
+    s_initialize("SESSION_TEST")
+    s_static("PING\r\n")
+
+@given('we have a session with an adaptive timeout of {timeout:d} seconds')
+def step_impl(context, timeout):
+    # the connection is accepted by the listening socket, nothing is ever
+    # sent back.
+    context.target = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    context.target.bind(("127.0.0.1", 0))
+    context.target.listen(5)
+
+    context.session = sessions.session(CONFIG, ROOT_DIR + "/../..",
+                                       SESSION_JOB_ID,
+                                       {"sleep_time": 0,
+                                        "timeout": timeout,
+                                        "adaptive_timeout": True},
+                                       {"media": "network", "protocol": "tcp"},
+                                       {"fail_connection": ["pass"],
+                                        "fail_receive": ["pass"],
+                                        "fail_send": ["pass"]},
+                                       {})
+    context.session.add_target({"address": "127.0.0.1",
+                                "port": context.target.getsockname()[1]})
+
+    context.failures = []
+    context.session.handle_crash = \
+        lambda event, message: context.failures.append(event)
+
+@given('the target responded in {latency:d} milliseconds so far')
+def step_impl(context, latency):
+    for index in range(0, context.session.deadline.samples):
+        context.session.deadline.record(latency / 1000.0)
+
+@when('we send {count:d} {noun} to a silent target')
+def step_impl(context, count, noun):
+    node = blocks.REQUESTS["SESSION_TEST"]
+    edge = context.session.connect(node)
+    context.session.fuzz_node = node
+    context.session.transport_media.connect()
+
+    started = time.time()
+    for index in range(0, count):
+        context.session.transmit(node, edge)
+    context.elapsed = time.time() - started
+
+    context.session.media_disconnect()
+    context.target.close()
+    context.session.database.deleteJob(SESSION_JOB_ID)
+
+@then('waiting for the response took less than {seconds:d} {noun}')
+def step_impl(context, seconds, noun):
+    assert context.elapsed < seconds
+
+@then('the missed response is not handled as a failure')
+def step_impl(context):
+    assert context.failures == []
+
+@then('the missed responses are handled as a failure once')
+def step_impl(context):
+    assert context.failures == ["fail_receive"]
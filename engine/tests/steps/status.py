@@ -0,0 +1,64 @@
+from behave import *
+import os
+import sys
+import inspect
+
+ROOT_DIR = os.path.dirname(
+                os.path.abspath(
+                    inspect.getfile(inspect.currentframe()
+                )))
+
+sys.path.append(ROOT_DIR + "/../../")
+from ConfigurationHandler import ConfigurationHandler
+from classes.DatabaseHandler import DatabaseHandler
+from classes.StatusWriter import StatusWriter
+
+CONFIG_FILE = ROOT_DIR + "/../../etc/engine.config"
+CONFIG      = ConfigurationHandler(CONFIG_FILE).get()
+DATABASE    = DatabaseHandler(CONFIG, ROOT_DIR)
+
+STATUS_JOB_ID = "bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb"
+
+@given('we have a status writer flushing every {count:d} updates')
+def step_impl(context, count):
+    DATABASE.deleteJob(STATUS_JOB_ID)
+    DATABASE.insertJob({"job_id": STATUS_JOB_ID})
+    config = dict(CONFIG)
+    config["status"] = {"flush_interval": 3600, "flush_count": count}
+    context.writer = StatusWriter(config, DATABASE, STATUS_JOB_ID)
+
+@when('we report {count:d} job status updates')
+def step_impl(context, count):
+    for index in range(1, count + 1):
+        context.writer.updateJob(1, "TEST", 0, 0, index, 100)
+    context.last_index = count
+
+@when('we report a job status update forcing the write')
+def step_impl(context):
+    context.writer.updateJob(2, "TEST", 0, 0, 1, 100, True)
+    context.last_index = 1
+
+@when('we report a job status update with statistics')
+def step_impl(context):
+    context.writer.updateJob(1, "TEST", 0, 0, 1, 100, True,
+                             {"recv_timeout": 0.5, "responses": 10})
+    context.last_index = 1
+
+@then('the job status is not written to the database')
+def step_impl(context):
+    job = DATABASE.loadJob(STATUS_JOB_ID)
+    DATABASE.deleteJob(STATUS_JOB_ID)
+    assert job.get("c_m_index") == None
+
+@then('the last job status is written to the database')
+def step_impl(context):
+    job = DATABASE.loadJob(STATUS_JOB_ID)
+    DATABASE.deleteJob(STATUS_JOB_ID)
+    assert job.get("c_m_index") == context.last_index
+
+@then('the statistics are written to the database')
+def step_impl(context):
+    job = DATABASE.loadJob(STATUS_JOB_ID)
+    DATABASE.deleteJob(STATUS_JOB_ID)
+    assert job.get("stats", {}).get("recv_timeout") == 0.5
+    assert job.get("stats", {}).get("responses") == 10
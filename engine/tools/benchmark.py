@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+""" Measure how fast the request descriptors mutate and render test cases """
+
+import os
+import gc
+import sys
+import json
+import time
+import inspect
+import argparse
+import resource
+import subprocess
+import multiprocessing
+
+ROOT_DIR = os.path.dirname(
+                os.path.dirname(
+                    os.path.abspath(
+                        inspect.getfile(inspect.currentframe()
+                    ))))
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, ROOT_DIR + "/modules/jobshandler")
+sys.path.insert(0, ROOT_DIR + "/requests")
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def list_descriptors():
+    descriptors = []
+    for filename in os.listdir(ROOT_DIR + "/requests"):
+        if not filename.endswith(".py") or filename == "__init__.py": continue
+        descriptors.append(filename[:-len(".py")])
+    descriptors.sort()
+    return descriptors
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                       cwd=ROOT_DIR,
+                                       stderr=open(os.devnull, "w")).strip()
+    except Exception, ex:
+        return None
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def percentile(samples, p):
+    if not samples: return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+# -----------------------------------------------------------------------------
+# Walk the mutations of a request, timing s_mutate() and s_render()
+# separately. Python 2 cannot count allocations, the number of objects
+# tracked by the garbage collector left behind by the walk is reported
+# instead, along with the collections it triggered.
+# -----------------------------------------------------------------------------
+
+def walk_request(name, cases):
+    from sulley import s_switch, s_mutate, s_render, s_num_mutations
+    s_switch(name)
+
+    mutate_times = []
+    render_times = []
+    total_bytes  = 0
+
+    gc.collect()
+    objects = len(gc.get_objects())
+    collections = [0, 0, 0]
+    counts = gc.get_count()
+
+    started = time.time()
+    while len(render_times) < cases:
+        t0 = time.time()
+        if not s_mutate(): break
+        t1 = time.time()
+        data = s_render()
+        t2 = time.time()
+
+        mutate_times.append(t1 - t0)
+        render_times.append(t2 - t1)
+        total_bytes += len(data)
+
+        current = gc.get_count()
+        for generation in range(3):
+            if current[generation] < counts[generation]:
+                collections[generation] += 1
+        counts = current
+    elapsed = time.time() - started
+
+    objects = len(gc.get_objects()) - objects
+    render_times.sort()
+    mutate_times.sort()
+
+    return {
+        "mutations":      s_num_mutations(),
+        "cases":          len(render_times),
+        "bytes":          total_bytes,
+        "seconds":        elapsed,
+        "cases_per_sec":  len(render_times) / elapsed if elapsed else 0.0,
+        "mutate_p50_us":  percentile(mutate_times, 50) * 1000000,
+        "mutate_p99_us":  percentile(mutate_times, 99) * 1000000,
+        "render_p50_us":  percentile(render_times, 50) * 1000000,
+        "render_p99_us":  percentile(render_times, 99) * 1000000,
+        "objects":        objects,
+        "collections":    collections
+    }
+
+# -----------------------------------------------------------------------------
+# Each descriptor is benchmarked in a process of its own, so the peak RSS is
+# not affected by the descriptors benchmarked before it.
+# -----------------------------------------------------------------------------
+
+def run_descriptor(descriptor, cases, queue):
+    result = {"descriptor": descriptor}
+    try:
+        from sulley import blocks
+        existing = set(blocks.REQUESTS.keys())
+        __import__(descriptor)
+        names = sorted(set(blocks.REQUESTS.keys()) - existing)
+
+        result["requests"] = {}
+        for name in names:
+            result["requests"][name] = walk_request(name, cases)
+
+        result["cases"] = sum([r["cases"] for r in result["requests"].values()])
+        result["seconds"] = sum([r["seconds"] for r in result["requests"].values()])
+        result["cases_per_sec"] = result["cases"] / result["seconds"] \
+                                  if result["seconds"] else 0.0
+        # ru_maxrss is in kilobytes on Linux
+        result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception, ex:
+        result["error"] = str(ex)
+    queue.put(result)
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def benchmark(descriptor, cases):
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=run_descriptor,
+                                args=(descriptor, cases, queue))
+    p.start()
+    result = queue.get()
+    p.join()
+    return result
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("descriptors", nargs="*",
+                        help="the descriptors to benchmark, as named in the "
+                             "requests directory without the .py extension, "
+                             "all of them if none given")
+    parser.add_argument("-n", "--cases", type=int, default=10000,
+                        help="the number of mutations to walk per request, "
+                             "default: 10000")
+    parser.add_argument("-o", "--output",
+                        help="the file to write the results to, by default "
+                             "they are written to the standard output")
+    args = parser.parse_args()
+
+    available = list_descriptors()
+    descriptors = args.descriptors or available
+    for descriptor in descriptors:
+        if descriptor not in available:
+            print >> sys.stderr, "[E] descriptor not found: %s" % descriptor
+            sys.exit(1)
+
+    results = {
+        "revision":    revision(),
+        "timestamp":   int(time.time()),
+        "python":      sys.version.split()[0],
+        "cases":       args.cases,
+        "descriptors": {}
+    }
+
+    for descriptor in descriptors:
+        print >> sys.stderr, "[i] benchmarking %s" % descriptor
+        results["descriptors"][descriptor] = benchmark(descriptor, args.cases)
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+    if args.output:
+        open(args.output, "w").write(output + "\n")
+    else:
+        print output
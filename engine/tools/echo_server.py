@@ -0,0 +1,103 @@
+#!/usr/bin/python
+
+""" A local TCP/UDP target echoing the test cases, for benchmarking the engine """
+
+import sys
+import socket
+import argparse
+import threading
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def response_for(data, response):
+    if response == None: return data
+    return response
+
+# -----------------------------------------------------------------------------
+# Each TCP connection is served by a thread of its own, so the engine can
+# keep connections open across test cases.
+# -----------------------------------------------------------------------------
+
+def serve_client(conn, size, response):
+    try:
+        while True:
+            data = conn.recv(size)
+            if not data: break
+            conn.sendall(response_for(data, response))
+    except socket.error, ex:
+        pass
+    finally:
+        conn.close()
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def serve_tcp(sock, size, response):
+    sock.listen(128)
+    while True:
+        (conn, address) = sock.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        t = threading.Thread(target=serve_client, args=(conn, size, response))
+        t.daemon = True
+        t.start()
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+def serve_udp(sock, size, response):
+    while True:
+        (data, address) = sock.recvfrom(size)
+        try:
+            sock.sendto(response_for(data, response), address)
+        except socket.error, ex:
+            pass
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("-a", "--address", default="127.0.0.1",
+                        help="the address to listen on, default: 127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=9999,
+                        help="the port to listen on, default: 9999")
+    parser.add_argument("-t", "--protocol", choices=["tcp", "udp"],
+                        default="tcp",
+                        help="the transport protocol, default: tcp")
+    parser.add_argument("-r", "--response",
+                        help="a fixed response to send instead of echoing "
+                             "the data received")
+    parser.add_argument("-s", "--size", type=int, default=65535,
+                        help="the size of the receive buffer, default: 65535")
+    args = parser.parse_args()
+
+    if args.protocol == "tcp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    try:
+        sock.bind((args.address, args.port))
+    except socket.error, ex:
+        print >> sys.stderr, "[E] failed to bind to %s:%d: %s" % \
+                             (args.address, args.port, str(ex))
+        sys.exit(1)
+
+    print >> sys.stderr, "[i] %s echo server listening on %s:%d" % \
+                         (args.protocol, args.address, args.port)
+
+    try:
+        if args.protocol == "tcp":
+            serve_tcp(sock, args.size, args.response)
+        else:
+            serve_udp(sock, args.size, args.response)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
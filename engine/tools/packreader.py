@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+""" List and extract test cases written by the file media in pack mode """
+
+import os
+import sys
+import inspect
+import argparse
+
+ROOT_DIR = os.path.dirname(
+                os.path.dirname(
+                    os.path.abspath(
+                        inspect.getfile(inspect.currentframe()
+                    ))))
+
+sys.path.insert(0, ROOT_DIR + "/modules/jobshandler/sulley")
+import pack
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("path", help="the directory holding the pack")
+    parser.add_argument("filename", help="the name of the pack as set in the "
+                                         "job target")
+    parser.add_argument("index", type=int, nargs="?",
+                        help="the index of the test case to extract, list the "
+                             "test cases if not given")
+    parser.add_argument("-o", "--output",
+                        help="the file to write the test case to, by default "
+                             "it is written to the standard output")
+    args = parser.parse_args()
+
+    p_reader = pack.reader(args.path, args.filename)
+
+    try:
+        if args.index == None:
+            for (index, base, offset, length) in p_reader.entries():
+                print "%d\t%s.pack\t%d\t%d" % (index, os.path.basename(base),
+                                               offset, length)
+            sys.exit(0)
+
+        data = p_reader.read(args.index)
+    except (IOError, OSError), ex:
+        print >> sys.stderr, "[E] failed to read pack: %s" % str(ex)
+        sys.exit(1)
+
+    if data == None:
+        print >> sys.stderr, "[E] test case %d not found" % args.index
+        sys.exit(1)
+
+    if args.output:
+        open(args.output, "wb").write(data)
+    else:
+        sys.stdout.write(data)